@@ -83,7 +83,9 @@ from app.core.security import (
 from pydantic import BaseModel
 
 # UserSettingsUpdate: 更新用户设置请求的数据模型
+# DEFAULT_USER_SETTINGS: 共享的默认设置实例（享元模式）
 from app.schemas.auth import (
+    DEFAULT_USER_SETTINGS,
     PasswordChange,
     TokenRefresh,
     TokenResponse,
@@ -106,6 +108,26 @@ router = APIRouter()
 limiter = Limiter(key_func=get_remote_address)
 
 
+def _user_settings(user: dict) -> UserSettings:
+    """
+    将用户文档中的 settings 字段转换为 UserSettings 实例。
+
+    大多数用户从未修改过默认设置，对应的文档字段与默认值完全相同。
+    这种情况下直接复用共享的 DEFAULT_USER_SETTINGS 实例（享元模式），
+    避免每次构建响应时重新分配并验证一个内容相同的对象。
+
+    Args:
+        user: 用户文档字典
+
+    Returns:
+        UserSettings: 共享默认实例或按文档内容构建的新实例
+    """
+    settings = user.get("settings")
+    if not settings or settings == {"defaultModel": "gpt-4o", "theme": "light"}:
+        return DEFAULT_USER_SETTINGS
+    return UserSettings(**settings)
+
+
 # ============================================================================
 # 注册功能（已禁用）
 # ============================================================================
@@ -145,7 +167,7 @@ limiter = Limiter(key_func=get_remote_address)
 #             email=user["email"],
 #             username=user["username"],
 #             createdAt=user["createdAt"],
-#             settings=user.get("settings"),
+#             settings=_user_settings(user),
 #         ),
 #         accessToken=access_token,
 #         refreshToken=refresh_token,
@@ -229,7 +251,7 @@ async def login(request: Request, credentials: UserLogin, db: CosmosDB) -> Token
             email=user["email"],
             username=user["username"],
             createdAt=user["createdAt"],
-            settings=user.get("settings"),
+            settings=_user_settings(user),
         ),
         accessToken=access_token,
         refreshToken=refresh_token,
@@ -322,7 +344,7 @@ async def get_current_user(user_id: CurrentUserId, db: CosmosDB) -> SuccessRespo
             email=user["email"],
             username=user["username"],
             createdAt=user["createdAt"],
-            settings=user.get("settings"),
+            settings=_user_settings(user),
         )
     )
 
@@ -47,6 +47,7 @@ SSE 事件类型：
 - message_start: 开始生成，包含用户消息 ID
 - content_delta: 内容增量，包含新生成的文本片段
 - message_end: 生成完成，包含完整消息 ID 和令牌统计
+- conversation_title: 首条消息的标题后台生成完毕（晚于 message_end）
 - error: 发生错误
 
 附件处理：
@@ -54,22 +55,40 @@ SSE 事件类型：
 - 文本文件：下载内容后作为上下文传给 AI
 """
 
+# asyncio: 异步 I/O 支持，用于把标题生成移出关键路径
+import asyncio
+
 # json: Python 标准库，用于 JSON 序列化（SSE 事件数据格式化）
 import json
 
+# orjson: Rust 实现的 JSON 库，SSE 热路径上比标准库快 3-5 倍
+# 可选依赖：未安装时回退到标准库 json
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore[assignment]
+
+# Any: 任意类型注解
+# Dict: 字典类型注解
+# List: 列表类型注解
 # Optional: 类型注解，表示可选参数
-from typing import Optional
+# Tuple: 元组类型注解
+from typing import Any, Dict, List, Optional, Tuple
 
 # APIRouter: 创建路由器实例
 # HTTPException: HTTP 异常类，用于返回错误响应
 # Query: 查询参数声明器，用于定义 URL 查询参数
 # Request: HTTP 请求对象
+# Response: 原始 HTTP 响应类，用于直接返回预序列化的 JSON 字节
 # status: HTTP 状态码常量集合
-from fastapi import APIRouter, HTTPException, Query, Request, status
+from fastapi import APIRouter, HTTPException, Query, Request, Response, status
 
 # StreamingResponse: 流式响应类，用于 SSE（服务器发送事件）
 from fastapi.responses import StreamingResponse
 
+# BaseModel: 用于 _json_response 的类型注解
+from pydantic import BaseModel
+
 # Limiter: 速率限制器类
 from slowapi import Limiter
 
@@ -107,11 +126,98 @@ router = APIRouter()
 limiter = Limiter(key_func=get_remote_address)
 
 
+def _json_response(model: BaseModel) -> Response:
+    """
+    绕过 FastAPI 的 jsonable_encoder，直接用 pydantic-core 序列化响应。
+
+    FastAPI 默认会在 json.dumps 之前调用 jsonable_encoder，
+    用纯 Python 递归遍历整个模型树。对于每次聊天请求都要
+    序列化的 MessageResponse 来说这是热路径上的额外开销。
+    pydantic-core 的 __pydantic_serializer__ 在 Rust 中一次性
+    输出 JSON 字节，省去这层 Python 递归。
+
+    Args:
+        model: 要序列化的 Pydantic 模型实例
+
+    Returns:
+        Response: 包含 JSON 字节的原始响应
+    """
+    payload = type(model).__pydantic_serializer__.to_json(model)
+    return Response(content=payload, media_type="application/json")
+
+
+if orjson is not None:
+    def _sse_event(event: str, data: Dict[str, Any]) -> bytes:
+        """
+        把事件编码为 SSE 帧字节。
+
+        流式回复的每个增量都要经过这里，是每 token 级别的热路径。
+        直接输出字节（orjson.dumps 产出 bytes，拼接无需再 encode），
+        省掉 json.dumps 的纯 Python 编码和 f-string 组装后
+        StreamingResponse 的二次 utf-8 编码——每个 token 只过一遍数据。
+        """
+        return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+else:
+    def _sse_event(event: str, data: Dict[str, Any]) -> bytes:
+        """把事件编码为 SSE 帧字节（标准库回退路径）。"""
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+async def _generate_and_persist_title(
+    openai_service,
+    db,
+    conversation_id: str,
+    user_id: str,
+    title_content: str,
+) -> Optional[str]:
+    """
+    后台生成对话标题并写回数据库。
+
+    从流式响应的关键路径上剥离出来，由 asyncio.create_task 调度；
+    任何失败都不影响主流程，只是对话保留默认标题。
+
+    Returns:
+        Optional[str]: 生成的标题；失败或为默认标题时返回 None
+    """
+    try:
+        title = await openai_service.generate_conversation_title(title_content)
+        if title and title != "新对话":
+            await db.update_conversation(conversation_id, user_id, {"title": title})
+            return title
+    except Exception:
+        # 标题生成失败不影响主流程
+        pass
+    return None
+
+
+def _history_for_api(history: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], ...]:
+    """
+    把存储层消息转换为 API 形态的不可变历史元组。
+
+    一次性构建 API 形态的 {"role", "content"} dict，之后整个请求
+    生命周期内直接拼接复用，不再逐轮重建。返回元组（而非列表）
+    表明历史是只读的：下游 _build_messages 直接 [sys, *history, user]
+    拼接，既省掉 O(N) 的 dict 拷贝，也保持对象身份稳定，
+    有利于 Azure 前缀缓存命中。
+
+    Args:
+        history: 存储层返回的消息文档列表
+
+    Returns:
+        Tuple[Dict, ...]: 只含 user/assistant 轮次的 API 消息元组
+    """
+    return tuple(
+        {"role": msg["role"], "content": msg["content"]}
+        for msg in history
+        if msg["role"] in ("user", "assistant")
+    )
+
+
 # ============================================================================
 # 获取消息历史
 # ============================================================================
 
-@router.get("/conversations/{conversation_id}/messages", response_model=SuccessResponse[MessageListResponse])
+@router.get("/conversations/{conversation_id}/messages", response_class=Response)
 @limiter.limit("60/minute")  # 限制每分钟 60 次请求
 async def get_messages(
     request: Request,
@@ -120,7 +226,7 @@ async def get_messages(
     db: CosmosDB,
     limit: int = Query(default=50, ge=1, le=200),
     before: Optional[str] = Query(default=None, description="获取此消息ID之前的消息"),
-) -> SuccessResponse[MessageListResponse]:
+) -> Response:
     """
     获取对话的消息历史。
     
@@ -166,10 +272,13 @@ async def get_messages(
     if has_more:
         messages = messages[:limit]
 
-    return SuccessResponse(
-        data=MessageListResponse(
-            messages=[MessageResponse(**msg) for msg in messages],
-            hasMore=has_more,
+    # 直接用 pydantic-core 序列化，跳过 FastAPI 的 response_model 重新验证
+    return _json_response(
+        SuccessResponse(
+            data=MessageListResponse(
+                messages=[MessageResponse(**msg) for msg in messages],
+                hasMore=has_more,
+            )
         )
     )
 
@@ -178,7 +287,7 @@ async def get_messages(
 # 发送消息（非流式）
 # ============================================================================
 
-@router.post("/conversations/{conversation_id}/messages", response_model=SuccessResponse[ChatResponse])
+@router.post("/conversations/{conversation_id}/messages", response_class=Response)
 @limiter.limit("20/minute")  # 限制每分钟 20 次消息发送
 async def send_message(
     request: Request,
@@ -186,7 +295,7 @@ async def send_message(
     chat_request: ChatRequest,
     user_id: CurrentUserId,
     db: CosmosDB,
-) -> SuccessResponse[ChatResponse]:
+) -> Response:
     """
     发送消息并获取非流式响应。
     
@@ -223,7 +332,8 @@ async def send_message(
         )
 
     # 获取历史消息作为上下文（最近 20 条）
-    history = await db.get_messages_by_conversation(conversation_id, limit=20)
+    # 只投影 role/content：历史只进提示词，不需要附件和令牌统计
+    history = await db.get_chat_history(conversation_id, limit=20)
 
     # 处理附件
     attachments = []
@@ -237,25 +347,11 @@ async def send_message(
                 "url": f"placeholder-url-for-{att.id}",
             })
 
-    # 保存用户消息
-    user_message = await db.create_message(
-        conversation_id=conversation_id,
-        message_data={
-            "role": "user",
-            "content": chat_request.content,
-            "attachments": [att.model_dump() for att in (chat_request.attachments or [])],
-        },
-    )
-
     # 调用 AI API 获取回复
     openai_service = get_openai_service()
-    
-    # 构建 API 需要的历史消息格式
-    history_for_api = [
-        {"role": msg["role"], "content": msg["content"]}
-        for msg in history
-        if msg["role"] in ("user", "assistant")
-    ]
+
+    # 构建 API 需要的历史消息格式（不可变元组，下游直接拼接）
+    history_for_api = _history_for_api(history)
 
     response = await openai_service.chat_completion(
         system_prompt=conversation["systemPrompt"],
@@ -264,10 +360,17 @@ async def send_message(
         attachments=attachments if attachments else None,
     )
 
-    # 保存 AI 回复
-    assistant_message = await db.create_message(
+    # 保存本轮的两条消息：用户消息 + AI 回复共享分区键，
+    # 事务批处理一次往返原子写入，不会留下没有回复的半个轮次
+    user_message, assistant_message = await db.create_message_pair(
         conversation_id=conversation_id,
-        message_data={
+        user_id=user_id,
+        user_message_data={
+            "role": "user",
+            "content": chat_request.content,
+            "attachments": [att.model_dump() for att in (chat_request.attachments or [])],
+        },
+        assistant_message_data={
             "role": "assistant",
             "content": response["content"],
             "tokens": response["tokens"],
@@ -275,16 +378,16 @@ async def send_message(
     )
 
     # 更新对话消息计数（+2：用户消息 + AI 回复）
-    await db.update_conversation(
-        conversation_id,
-        user_id,
-        {"messageCount": conversation["messageCount"] + 2},
-    )
-
-    return SuccessResponse(
-        data=ChatResponse(
-            userMessage=MessageResponse(**user_message),
-            assistantMessage=MessageResponse(**assistant_message),
+    # incr 补丁在服务端原子自增，并发发送消息也不会互相覆盖计数
+    await db.increment_message_count(conversation_id, user_id, by=2)
+
+    # 直接用 pydantic-core 序列化，跳过 FastAPI 的 response_model 重新验证
+    return _json_response(
+        SuccessResponse(
+            data=ChatResponse(
+                userMessage=MessageResponse(**user_message),
+                assistantMessage=MessageResponse(**assistant_message),
+            )
         )
     )
 
@@ -347,12 +450,14 @@ async def send_message_stream(
         )
 
     # 获取历史消息作为上下文（最近 20 条）
-    history = await db.get_messages_by_conversation(conversation_id, limit=20)
+    # 只投影 role/content：历史只进提示词，不需要附件和令牌统计
+    history = await db.get_chat_history(conversation_id, limit=20)
 
     # 立即保存用户消息（不等待 AI 回复）
     # 这样即使 AI 回复失败，用户消息也不会丢失
     user_message = await db.create_message(
         conversation_id=conversation_id,
+        user_id=user_id,
         message_data={
             "role": "user",
             "content": chat_request.content,
@@ -375,12 +480,8 @@ async def send_message_stream(
         openai_service = get_openai_service()
         blob_service = get_blob_service()
         
-        # 构建 API 需要的历史消息格式
-        history_for_api = [
-            {"role": msg["role"], "content": msg["content"]}
-            for msg in history
-            if msg["role"] in ("user", "assistant")
-        ]
+        # 构建 API 需要的历史消息格式（不可变元组，下游直接拼接）
+        history_for_api = _history_for_api(history)
 
         # ========== 处理附件 ==========
         # 图片和文本文件需要不同的处理方式
@@ -437,7 +538,7 @@ async def send_message_stream(
         message_id = None
         
         # 1. 发送开始事件
-        yield f"event: message_start\ndata: {json.dumps({'userMessageId': user_message['id']})}\n\n"
+        yield _sse_event("message_start", {"userMessageId": user_message["id"]})
 
         full_content = ""  # 累积完整的 AI 回复
         tokens = {"input": 0, "output": 0}
@@ -453,12 +554,13 @@ async def send_message_stream(
                 if chunk["type"] == "content_delta":
                     # 累积内容并发送增量
                     full_content += chunk["delta"]
-                    yield f"event: content_delta\ndata: {json.dumps({'delta': chunk['delta']})}\n\n"
+                    yield _sse_event("content_delta", {"delta": chunk["delta"]})
 
                 elif chunk["type"] == "finish":
                     # AI 回复完成，保存到数据库
                     assistant_message = await db.create_message(
                         conversation_id=conversation_id,
+                        user_id=user_id,
                         message_data={
                             "role": "assistant",
                             "content": full_content,
@@ -467,62 +569,55 @@ async def send_message_stream(
                     )
                     message_id = assistant_message["id"]
 
-                    # ========== 智能标题生成 ==========
-                    # 如果是对话的第一条消息，生成语义化标题
-                    new_title = None
+                    # 更新消息计数（标题由后台任务异步写入，不阻塞此处）
+                    # incr 补丁原子自增，避免并发流的丢失更新
+                    await db.increment_message_count(
+                        conversation_id, user_id, by=2
+                    )
+
+                    # ========== 智能标题生成（后台任务） ==========
+                    # 首条消息需要生成语义化标题，但标题的 LLM 往返
+                    # 不应把 message_end 推迟几百毫秒。先发完成事件让
+                    # 前端解锁输入框，标题生成放到后台任务，完成后通过
+                    # 追加的 conversation_title 事件通知前端更新侧边栏
+                    title_task = None
                     if conversation["messageCount"] == 0:
-                        try:
-                            # 确定用于生成标题的内容
-                            title_content = chat_request.content.strip()
-                            if not title_content:
-                                # 没有文字内容时使用默认标题
-                                if image_attachments:
-                                    title_content = "图片分析对话"
-                                elif text_file_contents:
-                                    title_content = f"文件分析: {text_file_contents[0]['fileName']}"
-                                else:
-                                    title_content = "新对话"
-                            
-                            # 使用 AI 生成标题
-                            new_title = await openai_service.generate_conversation_title(
-                                title_content
-                            )
-                            
-                            # 更新对话标题和消息计数
-                            await db.update_conversation(
-                                conversation_id,
-                                user_id,
-                                {
-                                    "messageCount": 2,
-                                    "title": new_title,
-                                },
-                            )
-                        except Exception as e:
-                            # 标题生成失败不影响主流程
-                            await db.update_conversation(
-                                conversation_id,
-                                user_id,
-                                {"messageCount": 2},
+                        # 确定用于生成标题的内容
+                        title_content = chat_request.content.strip()
+                        if not title_content:
+                            # 没有文字内容时使用默认标题
+                            if image_attachments:
+                                title_content = "图片分析对话"
+                            elif text_file_contents:
+                                title_content = f"文件分析: {text_file_contents[0]['fileName']}"
+                            else:
+                                title_content = "新对话"
+
+                        title_task = asyncio.create_task(
+                            _generate_and_persist_title(
+                                openai_service, db,
+                                conversation_id, user_id, title_content,
                             )
-                    else:
-                        # 非首条消息，只更新消息计数
-                        await db.update_conversation(
-                            conversation_id,
-                            user_id,
-                            {"messageCount": conversation["messageCount"] + 2},
                         )
 
-                    # 3. 发送完成事件
-                    end_data = {'messageId': message_id, 'tokens': tokens}
-                    if new_title:
-                        # 如果生成了新标题，一并返回
-                        end_data['conversationTitle'] = new_title
-                    
-                    yield f"event: message_end\ndata: {json.dumps(end_data)}\n\n"
+                    # 3. 发送完成事件（不等待标题）
+                    yield _sse_event(
+                        "message_end",
+                        {"messageId": message_id, "tokens": tokens},
+                    )
+
+                    # 4. 标题就绪后追加通知事件（失败时静默跳过）
+                    if title_task is not None:
+                        new_title = await title_task
+                        if new_title:
+                            yield _sse_event(
+                                "conversation_title",
+                                {"conversationTitle": new_title},
+                            )
 
         except Exception as e:
             # 发送错误事件
-            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+            yield _sse_event("error", {"error": str(e)})
 
     # 返回 SSE 流响应
     return StreamingResponse(
@@ -53,12 +53,14 @@ from app.core.sanitizer import sanitize_conversation_title
 # ConversationDeleteResponse: 删除对话响应的数据模型
 # ConversationListResponse: 对话列表响应的数据模型（包含分页信息）
 # ConversationResponse: 单个对话响应的数据模型
+# ConversationSummaryResponse: 对话摘要的数据模型（列表用，不含 systemPrompt）
 # ConversationUpdate: 更新对话请求的数据模型
 from app.schemas.conversation import (
     ConversationCreate,
     ConversationDeleteResponse,
     ConversationListResponse,
     ConversationResponse,
+    ConversationSummaryResponse,
     ConversationUpdate,
 )
 
@@ -85,6 +87,8 @@ async def list_conversations(
     db: CosmosDB,
     limit: int = Query(default=20, ge=1, le=100),  # 每页数量：1-100，默认 20
     offset: int = Query(default=0, ge=0),           # 跳过数量：>= 0，默认 0
+    # 延续令牌（服务端分页游标）；提供时优先于 offset
+    continuation_token: Optional[str] = Query(default=None, alias="continuationToken"),
 ) -> SuccessResponse[ConversationListResponse]:
     """
     获取当前用户的所有对话列表。
@@ -100,23 +104,38 @@ async def list_conversations(
     - 第 1 页: ?limit=20&offset=0
     - 第 2 页: ?limit=20&offset=20
     - 第 3 页: ?limit=20&offset=40
-    
+
+    推荐使用延续令牌分页（服务端游标，无 OFFSET 扫描开销）：
+    - 第 1 页: ?limit=20（响应携带 continuationToken）
+    - 下一页: ?limit=20&continuationToken=<上一页返回的令牌>
+
     Args:
         request: FastAPI 请求对象
         user_id: 当前用户 ID（从令牌提取）
         db: Cosmos DB 服务实例
         limit: 每页数量
         offset: 跳过数量
-        
+        continuation_token: 上一页返回的延续令牌（可选）
+
     Returns:
         SuccessResponse[ConversationListResponse]: 包含对话列表和分页信息的响应
     """
     # 获取对话列表
-    conversations = await db.get_conversations_by_user(
-        user_id=user_id,
-        limit=limit,
-        offset=offset,
-    )
+    # offset > 0 且无令牌时走传统 OFFSET 分页（兼容旧客户端）；
+    # 否则使用延续令牌分页，响应中返回下一页的令牌
+    next_token: Optional[str] = None
+    if offset > 0 and continuation_token is None:
+        conversations = await db.get_conversations_by_user(
+            user_id=user_id,
+            limit=limit,
+            offset=offset,
+        )
+    else:
+        conversations, next_token = await db.get_conversations_page(
+            user_id=user_id,
+            limit=limit,
+            continuation_token=continuation_token,
+        )
 
     # 获取对话总数（用于分页 UI）
     total = await db.count_conversations_by_user(user_id)
@@ -124,11 +143,12 @@ async def list_conversations(
     return SuccessResponse(
         data=ConversationListResponse(
             conversations=[
-                ConversationResponse(**conv) for conv in conversations
+                ConversationSummaryResponse(**conv) for conv in conversations
             ],
             total=total,
             limit=limit,
             offset=offset,
+            continuationToken=next_token,
         )
     )
 
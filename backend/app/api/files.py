@@ -153,19 +153,18 @@ async def upload_file(
             detail="无法确定文件类型",
         )
 
-    # 读取文件内容
-    content = await file.read()
-
     # 上传到 Blob Storage
     blob_service = get_blob_service()
 
     try:
-        # 验证并上传文件
-        result = await blob_service.upload_file(
+        # 流式验证并上传：不把整个文件读入内存，
+        # 边从 multipart 流读取边传给 Blob Storage
+        result = await blob_service.upload_file_stream(
             user_id=user_id,
-            file_content=content,
+            file_stream=file,
             content_type=file.content_type,
             filename=file.filename,
+            size_hint=file.size,
         )
     except ValueError as e:
         # 验证失败（类型不允许或大小超限）
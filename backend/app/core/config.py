@@ -24,6 +24,9 @@ Pydantic Settings 提供了以下优势：
 # lru_cache: 函数装饰器，用于缓存函数返回值（实现单例模式）
 from functools import lru_cache
 
+# os: 用于根据本文件位置推导 .env 的绝对路径
+import os
+
 # List: 类型注解，表示列表类型
 from typing import List
 
@@ -32,6 +35,12 @@ from typing import List
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
+# backend 目录的绝对路径（本文件位于 backend/app/core/config.py）
+# .env 查找以此为锚点，配置加载不再依赖进程当前工作目录——
+# 脚本和服务进程无论从哪里启动都能找到同一份 .env
+_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
 class Settings(BaseSettings):
     """
     应用程序配置类。
@@ -51,7 +60,11 @@ class Settings(BaseSettings):
     # Pydantic Settings 配置
     model_config = SettingsConfigDict(
         # 环境文件路径（按顺序加载，后面的覆盖前面的）
-        env_file=(".env", ".env.local"),
+        # 使用绝对路径：不要求进程 cwd 恰好是 backend 目录
+        env_file=(
+            os.path.join(_BACKEND_DIR, ".env"),
+            os.path.join(_BACKEND_DIR, ".env.local"),
+        ),
         # 环境文件编码
         env_file_encoding="utf-8",
         # 环境变量名称不区分大小写
@@ -30,6 +30,9 @@ FastAPI 依赖注入的工作原理：
 - 统一依赖的使用方式
 """
 
+# asyncio: 异步锁，保护数据库服务的首次初始化
+import asyncio
+
 # Annotated: 类型注解增强工具，用于为类型添加元数据（如依赖注入）
 # Optional: 类型注解，表示可选值
 from typing import Annotated, Optional
@@ -168,6 +171,11 @@ OptionalUserId = Annotated[Optional[str], Depends(get_optional_user_id)]
 # 使用全局变量确保整个应用共享同一个数据库连接
 _cosmos_service: Optional[CosmosDBService] = None
 
+# 首次初始化的互斥锁：并发的首批请求可能同时发现实例为 None，
+# 各自创建客户端（每个都带独立连接池和元数据抓取）；
+# 加锁确保进程内只初始化一次
+_cosmos_init_lock = asyncio.Lock()
+
 
 async def get_cosmos_db() -> CosmosDBService:
     """
@@ -194,12 +202,16 @@ async def get_cosmos_db() -> CosmosDBService:
         此依赖是异步的，因为数据库初始化需要异步操作
     """
     global _cosmos_service
-    
+
     if _cosmos_service is None:
-        # 首次调用，创建并初始化服务
-        _cosmos_service = CosmosDBService()
-        await _cosmos_service.initialize()
-    
+        async with _cosmos_init_lock:
+            # 双重检查：等锁期间可能已被其他协程初始化
+            if _cosmos_service is None:
+                # 首次调用，创建并初始化服务
+                service = CosmosDBService()
+                await service.initialize()
+                _cosmos_service = service
+
     return _cosmos_service
 
 
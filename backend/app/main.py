@@ -48,6 +48,12 @@ from app.core.config import get_settings
 # get_cosmos_db: 获取 Cosmos DB 数据库连接的依赖注入函数
 from app.core.dependencies import get_cosmos_db
 
+# close_http_client: 关闭 Azure OpenAI 共享的 HTTP 连接池
+from app.services.azure_openai import close_http_client
+
+# get_blob_service: 获取 Blob Storage 服务单例（关闭阶段释放异步客户端）
+from app.services.blob_storage import get_blob_service
+
 # ============================================================================
 # 速率限制器初始化
 # ============================================================================
@@ -94,6 +100,12 @@ async def lifespan(app: FastAPI):
     # ========== 关闭阶段 ==========
     # 在这里执行清理操作
     print("Shutting down AI Chat API...")
+    # 关闭 Cosmos DB 异步客户端（释放 aiohttp 连接池）
+    await db.close()
+    # 关闭 Azure OpenAI 共享的 HTTP 连接池，优雅释放保活连接
+    await close_http_client()
+    # 关闭 Blob Storage 异步客户端
+    await get_blob_service().close()
 
 
 def create_application() -> FastAPI:
@@ -6,7 +6,7 @@ from typing import Optional
 # BaseModel: Pydantic 的数据模型基类，提供数据验证和序列化功能
 # EmailStr: Pydantic 的邮箱类型，自动验证邮箱格式
 # Field: 字段声明器，用于定义字段的验证规则和元数据
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, ConfigDict, EmailStr, Field
 
 
 class UserSettings(BaseModel):
@@ -15,6 +15,16 @@ class UserSettings(BaseModel):
     defaultModel: str = "gpt-4o"
     theme: str = "light"
 
+    # 冻结实例，使默认设置可以作为享元（flyweight）安全共享
+    # （ConfigDict 而非嵌套 Config 类：mypyc 无法编译嵌套类体）
+    model_config = ConfigDict(frozen=True)
+
+
+# 共享的默认设置实例（享元模式）
+# 大部分用户的设置与默认值完全相同，复用同一个已验证的实例
+# 可以避免在每次构建响应时重新分配和验证一个相同的对象
+DEFAULT_USER_SETTINGS = UserSettings()
+
 
 class UserCreate(BaseModel):
     """Schema for user registration."""
@@ -40,8 +50,7 @@ class UserResponse(BaseModel):
     createdAt: str
     settings: Optional[UserSettings] = None
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class UserInDB(UserResponse):
@@ -6,7 +6,7 @@ from typing import List, Optional
 
 # BaseModel: Pydantic 的数据模型基类
 # Field: 字段声明器，用于定义字段的验证规则（如最大长度、默认值）
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class ConversationCreate(BaseModel):
@@ -40,17 +40,39 @@ class ConversationResponse(BaseModel):
     createdAt: str
     updatedAt: str
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
+
+class ConversationSummaryResponse(BaseModel):
+    """Schema for conversation summaries in list responses.
+
+    侧边栏列表只渲染这些字段；systemPrompt 可长达 4000 字符，
+    不投影它能显著降低列表查询的 RU 和传输量。
+    需要完整信息时使用单个对话的 GET 端点。
+    """
+
+    id: str
+    userId: str
+    title: str
+    model: str
+    messageCount: int
+    createdAt: str
+    updatedAt: str
+
+    model_config = ConfigDict(from_attributes=True)
 
 
 class ConversationListResponse(BaseModel):
     """Schema for paginated conversation list response."""
 
-    conversations: List[ConversationResponse]
+    conversations: List[ConversationSummaryResponse]
     total: int
     limit: int
     offset: int
+    # 延续令牌分页：把该值作为 continuationToken 传回即可取下一页，
+    # 服务端从索引位置直接继续，无 OFFSET 扫描开销；
+    # None 表示没有更多数据（或本次走的是 offset 分页）
+    continuationToken: Optional[str] = None
 
 
 class ConversationDeleteResponse(BaseModel):
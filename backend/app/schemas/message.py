@@ -8,7 +8,7 @@ from typing import List, Literal, Optional
 # BaseModel: Pydantic 的数据模型基类
 # Field: 字段声明器，用于定义字段的验证规则
 # model_validator: 模型级验证器装饰器，用于跨字段验证
-from pydantic import BaseModel, Field, model_validator
+from pydantic import BaseModel, ConfigDict, Field, model_validator
 
 
 class Attachment(BaseModel):
@@ -39,20 +39,31 @@ class TokenUsage(BaseModel):
     output: int
 
 
-class MessageCreate(BaseModel):
-    """Schema for creating a new message."""
+class _UserInputBase(BaseModel):
+    """Shared base for user input carrying content and/or attachments.
+
+    MessageCreate 和 ChatRequest 的字段与校验逻辑完全相同；
+    共用一个基类可以让 pydantic-core 只构建一份验证器 schema，
+    而不是为两个相同的模型各构建一份。
+    """
 
     content: str = Field(default="", max_length=32000)
     attachments: Optional[List[AttachmentRef]] = None
 
     @model_validator(mode='after')
-    def validate_content_or_attachments(self) -> 'MessageCreate':
+    def validate_content_or_attachments(self) -> '_UserInputBase':
         """Ensure at least content or attachments are provided."""
-        if not self.content.strip() and (not self.attachments or len(self.attachments) == 0):
+        # str.isspace() 是单次 C 调用，不像 strip() 那样分配新字符串；
+        # 此校验在每条聊天请求上执行，避免热路径上的无谓分配
+        if not self.attachments and (not self.content or self.content.isspace()):
             raise ValueError('消息内容和附件不能同时为空')
         return self
 
 
+class MessageCreate(_UserInputBase):
+    """Schema for creating a new message."""
+
+
 class MessageResponse(BaseModel):
     """Schema for message data in responses."""
 
@@ -64,8 +75,7 @@ class MessageResponse(BaseModel):
     tokens: Optional[TokenUsage] = None
     createdAt: str
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class MessageListResponse(BaseModel):
@@ -75,19 +85,9 @@ class MessageListResponse(BaseModel):
     hasMore: bool
 
 
-class ChatRequest(BaseModel):
+class ChatRequest(_UserInputBase):
     """Schema for chat completion request."""
 
-    content: str = Field(default="", max_length=32000)
-    attachments: Optional[List[AttachmentRef]] = None
-
-    @model_validator(mode='after')
-    def validate_content_or_attachments(self) -> 'ChatRequest':
-        """Ensure at least content or attachments are provided."""
-        if not self.content.strip() and (not self.attachments or len(self.attachments) == 0):
-            raise ValueError('消息内容和附件不能同时为空')
-        return self
-
 
 class ChatResponse(BaseModel):
     """Schema for non-streaming chat response."""
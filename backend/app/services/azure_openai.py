@@ -36,9 +36,24 @@ Azure OpenAI vs OpenAI：
 - 提供更好的用户体验，无需等待完整响应
 """
 
+# asyncio: 异步 I/O 支持，这里用事件循环时钟做流式微批计时
+import asyncio
+
+# hashlib: 标准库哈希工具，用于计算缓存键
+import hashlib
+
+# json: 标准库 JSON，作为 orjson 缺失时的解析回退
+import json
+
 # logging: Python 标准库，提供日志记录功能
 import logging
 
+# lru_cache: 函数结果缓存装饰器
+from functools import lru_cache
+
+# TTLCache: 带过期时间的内存缓存（cachetools 已是项目依赖）
+from cachetools import TTLCache
+
 # Any: 任意类型注解
 # AsyncGenerator: 异步生成器类型注解，用于流式响应
 # Dict: 字典类型注解
@@ -46,26 +61,361 @@ import logging
 # Optional: 可选类型注解
 from typing import Any, AsyncGenerator, Dict, List, Optional
 
-# AzureOpenAI: Azure OpenAI 同步客户端，用于非流式请求
-# AsyncAzureOpenAI: Azure OpenAI 异步客户端，用于流式响应
-from openai import AzureOpenAI, AsyncAzureOpenAI
+# httpx: openai SDK 底层使用的 HTTP 客户端库
+# 显式创建共享客户端以便调整连接池参数
+import httpx
+
+# orjson: Rust 实现的 JSON 库，序列化比标准库快 3-5 倍
+# 可选依赖：未安装时回退到标准库 json
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore[assignment]
+
+# 流式 SSE 解析使用的 JSON 解析函数（orjson 可用时优先）
+_json_loads = orjson.loads if orjson is not None else json.loads
+
+# AsyncAzureOpenAI: Azure OpenAI 异步客户端
+# 所有请求（流式和非流式）都走异步客户端，避免阻塞事件循环
+# RateLimitError: 429 配额超限异常，用于入场控制的动态降速
+from openai import AsyncAzureOpenAI, RateLimitError
 
 # get_settings: 获取应用配置的函数
 from app.core.config import get_settings
 
+# queue: 标准库队列，用于异步日志队列
+import queue
+
+# QueueHandler/QueueListener: 把日志 I/O 移到后台线程
+# 流式热路径上的同步 stderr 写入（docker 日志驱动、管道）可能阻塞，
+# 队列化之后调用方只做一次入队，格式化和写出在监听线程完成
+from logging.handlers import QueueHandler, QueueListener
+
 # 配置日志记录器
 # 使用模块名作为 logger 名称，便于日志分类和过滤
 logger = logging.getLogger(__name__)
 
+# ============================================================================
+# 异步日志：本模块的日志经由队列在后台线程写出
+# ============================================================================
+_log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+_log_listener = QueueListener(_log_queue, logging.StreamHandler())
+_log_listener.start()
+logger.addHandler(QueueHandler(_log_queue))
+# 不再向根 logger 传播，避免同一条日志被同步处理器重复写出
+logger.propagate = False
+
+
+# ============================================================================
+# 共享 HTTP 连接池
+# ============================================================================
+# 默认情况下每个 AsyncAzureOpenAI 实例会创建自己的 httpx 客户端
+# （默认 100 连接 / 20 保活）。共享一个调大的连接池可以：
+# 1. 复用 TLS 连接，避免突发流量下的握手风暴
+# 2. 避免多个客户端各自持有独立连接池导致的资源浪费
+_shared_http_client: Optional[httpx.AsyncClient] = None
+
+
+class _OrjsonAsyncClient(httpx.AsyncClient):
+    """
+    用 orjson 序列化请求体的 httpx 客户端。
+
+    httpx（以及 openai SDK）默认用标准库 json 序列化 json= 请求体；
+    对于带长历史或多张图片 URL 的多模态消息，序列化在发送前
+    占据可观的 CPU。orjson 在 Rust 中一次性输出字节，快 3-5 倍。
+    orjson 未安装时不做任何改写，行为与普通 AsyncClient 一致。
+    """
+
+    def build_request(self, method, url, **kwargs):  # type: ignore[override]
+        json_body = kwargs.get("json")
+        if orjson is not None and json_body is not None and kwargs.get("content") is None:
+            try:
+                content = orjson.dumps(json_body)
+            except TypeError:
+                # 含 orjson 不支持的类型时回退到标准库路径
+                pass
+            else:
+                kwargs["json"] = None
+                kwargs["content"] = content
+                headers = dict(kwargs.get("headers") or {})
+                # 大小写不敏感地补充 Content-Type，避免重复头
+                if not any(k.lower() == "content-type" for k in headers):
+                    headers["content-type"] = "application/json"
+                kwargs["headers"] = headers
+        return super().build_request(method, url, **kwargs)
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    """获取（按需创建）共享的 httpx 异步客户端。"""
+    global _shared_http_client
+
+    if _shared_http_client is None:
+        _shared_http_client = _OrjsonAsyncClient(
+            limits=httpx.Limits(
+                max_connections=512,
+                max_keepalive_connections=256,
+                keepalive_expiry=90,
+            ),
+            # 整体 60 秒超时，连接阶段 5 秒（快速失败）
+            timeout=httpx.Timeout(60.0, connect=5.0),
+        )
+
+    return _shared_http_client
+
+
+async def close_http_client() -> None:
+    """关闭共享的 HTTP 客户端，应在应用关闭时调用（lifespan shutdown）。"""
+    global _shared_http_client
+
+    if _shared_http_client is not None:
+        await _shared_http_client.aclose()
+        _shared_http_client = None
+
+
+# ============================================================================
+# 响应缓存
+# ============================================================================
+# 相同问题的重复提问（FAQ、重试、导入流程）没必要每次都打一个
+# 数秒级的 LLM 往返。这里用进程内 TTLCache 做精确匹配缓存：
+# - 只在低温度（<= 0.3，输出接近确定性）且无附件时启用
+# - 键包含提示词版本前缀，提示词升级后旧缓存自动失效
+# - TTL 1 小时，命中时直接返回缓存的内容和令牌统计
+_completion_cache: TTLCache = TTLCache(maxsize=1024, ttl=3600)
+
+# 缓存键版本前缀，提示词或缓存格式变更时递增
+_CACHE_KEY_VERSION = "v1"
+
+# 标题缓存：同一条首消息总是生成相同标题（temperature 0.3，输出稳定），
+# 精确匹配即可，TTL 7 天。导入/重试流程中重复标题生成完全走缓存
+_title_cache: TTLCache = TTLCache(maxsize=4096, ttl=604800)
+
+
+def _title_cache_key(user_message: str) -> str:
+    """计算标题生成的缓存键（归一化后 SHA-256）。
+
+    归一化与标题提示词的输入截断保持一致（取前 500 字符），
+    首尾空白和大小写差异视为同一消息。键带版本前缀，
+    标题提示词调整后递增版本即可整体失效旧缓存。
+    """
+    norm = user_message[:500].strip().casefold()
+    return f"title:{_CACHE_KEY_VERSION}:{hashlib.sha256(norm.encode()).hexdigest()}"
+
+
+def _clean_title(content: Optional[str], max_length: int) -> str:
+    """清理模型输出的标题：去空白/引号、截断长度，空结果退回"新对话"。"""
+    title = content.strip() if content else "新对话"
+
+    # 移除可能存在的引号
+    title = title.strip('"\'""''')
+
+    # 确保标题不超过最大长度
+    if len(title) > max_length:
+        title = title[:max_length]
+
+    return title if title else "新对话"
+
+
+def _completion_cache_key(
+    system_prompt: str,
+    history: List[Dict[str, Any]],
+    user_message: str,
+    max_tokens: int,
+    temperature: float,
+) -> str:
+    """计算非流式补全的缓存键（SHA-256 精确匹配）。"""
+    hasher = hashlib.sha256()
+    hasher.update(system_prompt.encode())
+    # 历史摘要：只取角色和内容，保证与消息构建逻辑一致
+    for msg in history:
+        hasher.update(str(msg.get("role")).encode())
+        hasher.update(str(msg.get("content")).encode())
+        hasher.update(b"\x00")
+    # 归一化用户消息：首尾空白和大小写差异视为同一问题
+    hasher.update(user_message.strip().casefold().encode())
+    hasher.update(f"{max_tokens}:{temperature}".encode())
+    return f"chat:{_CACHE_KEY_VERSION}:{hasher.hexdigest()}"
+
+
+# ============================================================================
+# 入场控制（客户端限流）
+# ============================================================================
+# 不加约束的突发并发会超出 Azure 部署的 TPM/RPM 配额，触发 429；
+# SDK 的被动重试会把延迟摊到无关请求上。这里用一个可动态缩减的
+# 在途计数器做主动限流：
+# 1. 正常情况下最多 _MAX_CONCURRENCY 个请求同时在途
+# 2. 收到 429 时立即把上限缩到当前在途数以下，按 Retry-After 定时恢复
+# 3. 等待者通过 Condition 排队，避免 429 风暴和队头阻塞
+_MAX_CONCURRENCY = 16
+
+
+class _Admission:
+    """Condition 保护的在途计数器，支持 429 触发的动态缩容。"""
+
+    def __init__(self, max_concurrency: int) -> None:
+        self._max = max_concurrency      # 正常上限
+        self._limit = max_concurrency    # 当前上限（429 后临时缩减）
+        self._active = 0                 # 在途请求数
+        self._cond = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        """等待直到有空位，然后占用一个在途名额。"""
+        async with self._cond:
+            while self._active >= self._limit:
+                await self._cond.wait()
+            self._active += 1
+
+    async def release(self) -> None:
+        """释放名额并唤醒一个等待者。"""
+        async with self._cond:
+            self._active -= 1
+            self._cond.notify(1)
+
+    def throttle(self, retry_after: float) -> None:
+        """收到 429：缩减上限并在 Retry-After 秒后恢复。"""
+        self._limit = max(1, self._active - 1)
+        logger.warning(
+            "Rate limited by Azure, reducing concurrency to %d for %.1fs",
+            self._limit, retry_after,
+        )
+        asyncio.get_running_loop().call_later(retry_after, self._restore)
+
+    def _restore(self) -> None:
+        """恢复正常上限并唤醒等待者（在事件循环线程中调用）。"""
+        self._limit = self._max
+        asyncio.ensure_future(self._notify_all())
+
+    async def _notify_all(self) -> None:
+        async with self._cond:
+            self._cond.notify_all()
+
+
+# 全局入场控制器，所有 Azure OpenAI 请求共用
+_admission = _Admission(_MAX_CONCURRENCY)
+
+
+def _retry_after_seconds(e: RateLimitError) -> float:
+    """从 429 响应头解析 Retry-After（缺失或非法时退回 5 秒）。"""
+    try:
+        return float(e.response.headers.get("retry-after", 5))
+    except (AttributeError, TypeError, ValueError):
+        return 5.0
+
+
+# ============================================================================
+# 并发请求合并（流式）
+# ============================================================================
+# 多个用户并发提出完全相同的确定性问题时，只向 Azure 发起一次
+# 上游流，其余请求订阅同一个广播。上游成本随"去重后的提问数"
+# 而不是总 RPS 增长，同时减轻速率限制压力
+class _StreamBroadcast:
+    """单个在途上游流的广播器：记录全部事件供跟随者重放/追赶。"""
+
+    def __init__(self) -> None:
+        self.events: List[Dict[str, Any]] = []   # 已发布的事件（跟随者从头重放）
+        self.finished = False                     # 上游流是否已结束
+        self.error: Optional[BaseException] = None
+        # 每次发布/结束时换一个新 Event，跟随者等待它被触发
+        self._new_event = asyncio.Event()
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        """发布一个事件并唤醒所有等待的跟随者。"""
+        self.events.append(event)
+        self._new_event.set()
+        self._new_event = asyncio.Event()
+
+    def close(self, error: Optional[BaseException] = None) -> None:
+        """标记流结束（可附带错误），唤醒所有跟随者。"""
+        self.error = error
+        self.finished = True
+        self._new_event.set()
+
+    async def subscribe(self) -> AsyncGenerator[Dict[str, Any], None]:
+        """从头重放已有事件，然后实时跟随新事件直到流结束。"""
+        index = 0
+        while True:
+            # 先拿住当前的等待事件，再消费已发布的事件
+            # （若消费期间有新发布，该事件已被触发，wait 立即返回）
+            waiter = self._new_event
+
+            while index < len(self.events):
+                yield self.events[index]
+                index += 1
+
+            if self.finished:
+                if self.error is not None:
+                    raise self.error
+                return
+
+            # 等待下一批事件或结束信号
+            await waiter.wait()
+
+
+# 在途流注册表：缓存键 -> 广播器
+_inflight_streams: Dict[str, _StreamBroadcast] = {}
+
+
+# ============================================================================
+# 历史压缩
+# ============================================================================
+# 中间轮次的占位消息：内容固定（不含数量等可变信息），
+# 保证压缩后的前缀在轮次之间保持字节稳定，不破坏 Azure 前缀缓存
+_OMISSION_MESSAGE: Dict[str, Any] = {
+    "role": "assistant",
+    "content": "（部分较早的对话内容已省略）",
+}
+
+
+def compact_history(
+    history: List[Dict[str, Any]],
+    keep_head: int = 4,
+    keep_tail: int = 10,
+) -> List[Dict[str, Any]]:
+    """
+    确定性地压缩过长的对话历史。
+
+    长对话每轮都把全部历史送给模型，提示词随轮次线性增长。
+    压缩策略：保留最早的 keep_head 条（对话主题的锚点，和系统提示
+    一起构成稳定前缀）+ 一条固定的省略占位消息 + 最近的 keep_tail 条
+    （当前上下文）。占位消息内容固定，因此压缩不会破坏前缀缓存。
+
+    Args:
+        history: API 形态的历史消息列表
+        keep_head: 保留的最早消息数
+        keep_tail: 保留的最近消息数
+
+    Returns:
+        List[Dict]: 压缩后的历史；不需要压缩时原样返回
+    """
+    # 只差一条时压缩反而多出占位消息，不做处理
+    if len(history) <= keep_head + keep_tail + 1:
+        return history
+
+    return [*history[:keep_head], _OMISSION_MESSAGE, *history[-keep_tail:]]
+
+
+# maxsize 128：覆盖全部内置人设提示词之外，还给用户自定义
+# 提示词留出余量；超出后按 LRU 淘汰最久未使用的人设
+@lru_cache(maxsize=128)
+def _system_message(system_prompt: str) -> Dict[str, Any]:
+    """
+    按提示词内容缓存系统消息 dict（每个人设一个实例，永久复用）。
+
+    同一个系统提示在所有轮次/请求中复用同一个 dict 实例，
+    保证序列化结果字节级一致，是 Azure 前缀缓存命中的前提。
+    返回的 dict 视为只读，调用方不得修改
+    （不用 MappingProxyType 包装是因为 SDK 序列化要求真正的 dict）。
+    """
+    return {"role": "system", "content": system_prompt}
+
 
 class AzureOpenAIService:
     """
     Azure OpenAI 服务类。
     
-    封装与 Azure OpenAI API 的所有交互，提供同步和异步两种客户端：
-    - 同步客户端：用于简单的请求-响应场景
-    - 异步客户端：用于流式响应，支持真正的异步迭代
-    
+    封装与 Azure OpenAI API 的所有交互，统一使用异步客户端：
+    - 非流式请求：await 完整响应
+    - 流式响应：async for 迭代，支持真正的异步迭代
+
     设计模式：
     - 使用单例模式（通过 get_openai_service 函数）
     - 延迟初始化客户端
@@ -74,39 +424,43 @@ class AzureOpenAIService:
     def __init__(self) -> None:
         """
         初始化 Azure OpenAI 服务。
-        
-        创建同步和异步两个客户端实例，用于不同的使用场景。
+
+        创建异步客户端实例，供流式和非流式请求共用。
         初始化时会记录配置信息用于调试。
         """
         self.settings = get_settings()
-        
-        # 记录配置信息用于调试（注意：只记录 API Key 的前 8 个字符）
-        logger.info(f"Initializing Azure OpenAI Service")
-        logger.info(f"  Endpoint: {self.settings.azure_openai_endpoint}")
-        logger.info(f"  Deployment: {self.settings.azure_openai_deployment_name}")
-        logger.info(f"  API Version: {self.settings.azure_openai_api_version}")
-        logger.info(f"  API Key (first 8 chars): {self.settings.azure_openai_api_key[:8]}...")
-        
-        # ========== 同步客户端 ==========
-        # 用于非流式操作，如生成标题、简单对话
-        self.client = AzureOpenAI(
-            api_key=self.settings.azure_openai_api_key,
-            api_version=self.settings.azure_openai_api_version,
-            azure_endpoint=self.settings.azure_openai_endpoint,
+
+        # 配置信息只在 DEBUG 级别记录；绝不记录 API Key 的任何部分
+        # （密钥前缀进日志是安全/合规风险，且每个 worker 启动都会打一遍）
+        logger.debug(
+            "Initializing Azure OpenAI Service: endpoint=%s deployment=%s api_version=%s",
+            self.settings.azure_openai_endpoint,
+            self.settings.azure_openai_deployment_name,
+            self.settings.azure_openai_api_version,
         )
-        
+
+
         # ========== 异步客户端 ==========
-        # 用于流式响应，支持 async for 迭代
-        # 这对于 SSE（服务器发送事件）场景至关重要
+        # 流式和非流式请求统一使用异步客户端
+        # 同步调用会在模型响应期间（数秒）阻塞 uvicorn 事件循环，
+        # 把单个工作进程的并发请求串行化；异步客户端让多个请求
+        # 在同一进程中并发地等待 I/O
         self.async_client = AsyncAzureOpenAI(
             api_key=self.settings.azure_openai_api_key,
             api_version=self.settings.azure_openai_api_version,
             azure_endpoint=self.settings.azure_openai_endpoint,
+            # 使用共享的 httpx 客户端（调大的连接池），而不是 SDK 默认值
+            http_client=_get_http_client(),
         )
         
         # 保存部署名称供后续使用
         self.deployment_name = self.settings.azure_openai_deployment_name
-        logger.info(f"Azure OpenAI client initialized successfully")
+
+        # 标题生成微批的待处理队列和冲刷任务
+        self._title_pending: List[tuple] = []
+        self._title_flush_task: Optional["asyncio.Task[None]"] = None
+
+        logger.debug("Azure OpenAI client initialized successfully")
 
     def _build_messages(
         self,
@@ -117,61 +471,69 @@ class AzureOpenAIService:
     ) -> List[Dict[str, Any]]:
         """
         构建聊天补全 API 的消息数组。
-        
+
         根据 OpenAI 的消息格式规范，构建包含系统提示、历史对话和当前用户消息的数组。
         如果有图片附件，会构建多模态消息格式。
-        
+
         消息顺序：
         1. 系统提示（设定 AI 的行为和角色）
         2. 历史消息（提供对话上下文）
         3. 当前用户消息（可能包含图片）
-        
+
+        前缀缓存友好性（Azure OpenAI Prefix Caching）：
+        Azure 会自动缓存 ≥1024 token 的重复前缀，命中时输入令牌打折且
+        TTFT 显著降低。要命中缓存，系统提示 + 历史部分必须在多轮之间
+        字节级一致。因此：
+        1. 系统消息 dict 按 system_prompt 缓存复用（同一实例、同一键序）
+        2. 历史消息原样引用，不重建 dict（键序由存储层保证稳定）
+        3. 只有末尾的当前用户消息在轮次之间变化
+        4. 附件按 url 稳定排序，避免顺序抖动破坏缓存
+
         Args:
             system_prompt: 系统提示词，用于设定 AI 的行为
             history: 历史对话消息列表
             user_message: 当前用户消息内容
             attachments: 可选的附件列表（目前支持图片）
-            
+
         Returns:
             List[Dict]: 符合 OpenAI API 规范的消息数组
-            
+
         多模态支持：
         - 当存在图片附件时，用户消息会被转换为多模态格式
         - 图片通过 URL 传递给 API（需要是可公开访问的 URL）
         - detail 参数控制图片分析的详细程度
         """
-        # 初始化消息列表，首先添加系统提示
-        messages: List[Dict[str, Any]] = [
-            {"role": "system", "content": system_prompt}
-        ]
+        # 系统消息按提示词内容缓存复用
+        # 保证同一提示词在多轮请求中序列化出完全相同的字节
+        system_msg = _system_message(system_prompt)
 
-        # 添加历史对话记录
-        # 这为 AI 提供对话上下文，使其能够进行连贯的多轮对话
-        for msg in history:
-            messages.append({
-                "role": msg["role"],      # "user" 或 "assistant"
-                "content": msg["content"],
-            })
+        # 初始化消息列表：稳定前缀 = 系统提示 + 历史
+        # 历史消息 dict 原样引用（不重建），既省分配又保持键序稳定
+        messages: List[Dict[str, Any]] = [system_msg, *history]
 
-        # 构建当前用户消息
+        # 构建当前用户消息（唯一在轮次之间变化的部分）
         if attachments:
             # 多模态消息格式（带图片）
             # content 是一个数组，包含文本和图片
             content: List[Dict[str, Any]] = [{"type": "text", "text": user_message}]
-            
-            for attachment in attachments:
-                if attachment.get("type") == "image":
-                    # 添加图片到消息内容
-                    content.append({
-                        "type": "image_url",
-                        "image_url": {
-                            "url": attachment["url"],
-                            # detail 可以是 "auto", "low", "high"
-                            # "auto" 让模型自动选择
-                            "detail": "auto",
-                        },
-                    })
-            
+
+            # 按 url 稳定排序，保证同一组附件总是产生相同的序列化结果
+            image_attachments = sorted(
+                (a for a in attachments if a.get("type") == "image"),
+                key=lambda a: a.get("url") or "",
+            )
+            for attachment in image_attachments:
+                # 添加图片到消息内容
+                content.append({
+                    "type": "image_url",
+                    "image_url": {
+                        "url": attachment["url"],
+                        # detail 可以是 "auto", "low", "high"
+                        # "auto" 让模型自动选择
+                        "detail": "auto",
+                    },
+                })
+
             messages.append({"role": "user", "content": content})
         else:
             # 纯文本消息格式
@@ -213,19 +575,44 @@ class AzureOpenAIService:
         - 0.7: 平衡创造性和一致性
         - 1.0+: 更具创造性，适合创意写作
         """
+        # 压缩过长历史，给模型的提示词长度有上界
+        history = compact_history(history)
+
+        # ========== 响应缓存查找 ==========
+        # 仅在低温度（输出接近确定性）且无附件时启用缓存，
+        # 高温度请求期望输出有随机性，不应返回缓存结果
+        cacheable = temperature <= 0.3 and not attachments
+        cache_key = None
+        if cacheable:
+            cache_key = _completion_cache_key(
+                system_prompt, history, user_message, max_tokens, temperature
+            )
+            cached = _completion_cache.get(cache_key)
+            if cached is not None:
+                # 返回浅拷贝，避免调用方修改污染缓存
+                return dict(cached)
+
         # 构建消息数组
         messages = self._build_messages(system_prompt, history, user_message, attachments)
 
-        # 调用 Azure OpenAI API
-        response = self.client.chat.completions.create(
-            model=self.deployment_name,  # Azure 中使用部署名称
-            messages=messages,
-            max_tokens=max_tokens,
-            temperature=temperature,
-        )
+        # 调用 Azure OpenAI API（异步，不阻塞事件循环）
+        # 经过入场控制，突发流量在客户端排队而不是打爆 Azure 配额
+        await _admission.acquire()
+        try:
+            response = await self.async_client.chat.completions.create(
+                model=self.deployment_name,  # Azure 中使用部署名称
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+            )
+        except RateLimitError as e:
+            _admission.throttle(_retry_after_seconds(e))
+            raise
+        finally:
+            await _admission.release()
 
-        # 解析并返回响应
-        return {
+        # 解析响应
+        result = {
             "content": response.choices[0].message.content,
             "tokens": {
                 "input": response.usage.prompt_tokens if response.usage else 0,
@@ -234,6 +621,12 @@ class AzureOpenAIService:
             "finish_reason": response.choices[0].finish_reason,
         }
 
+        # 只缓存正常完成的响应（"length" 截断的不值得复用）
+        if cache_key is not None and result["finish_reason"] == "stop":
+            _completion_cache[cache_key] = result
+
+        return result
+
     async def generate_conversation_title(
         self,
         user_message: str,
@@ -257,6 +650,144 @@ class AzureOpenAIService:
         - 限制输入长度避免超出令牌限制
         - 清理输出中的引号和标点
         """
+        # ========== 标题缓存查找 ==========
+        # 相同首消息直接复用已生成的标题，省掉一次 Azure 往返
+        cache_key = _title_cache_key(user_message)
+        cached_title = _title_cache.get(cache_key)
+        if cached_title is not None:
+            return cached_title
+
+        try:
+            # 经由微批器提交：50ms 收集窗口内的并发标题请求
+            # 合并为一次 Azure 调用（批量导入/重建场景收益最大）
+            title = await self._submit_title(user_message, max_length)
+
+            # 只缓存成功生成的标题（降级标题不缓存，留待下次重试）
+            if title != "新对话":
+                _title_cache[cache_key] = title
+
+            return title
+
+        except Exception as e:
+            # 标题生成失败不应影响主流程
+            logger.warning("Failed to generate title: %s", e)
+            return "新对话"
+
+    # ------------------------------------------------------------------
+    # 标题生成微批
+    # ------------------------------------------------------------------
+    # 标题任务短小且低令牌，批量场景（历史导入、批量重建）下逐条调用
+    # 浪费 RPM 配额和 HTTP 往返。这里用 50ms 收集窗口把并发请求合并为
+    # 一次调用（一次最多 8 条），让模型返回 JSON 数组后按序分发结果
+
+    async def _submit_title(self, user_message: str, max_length: int) -> str:
+        """把标题请求放入微批队列并等待结果。"""
+        loop = asyncio.get_running_loop()
+        future: "asyncio.Future[str]" = loop.create_future()
+        self._title_pending.append((user_message, max_length, future))
+
+        # 没有在途的冲刷任务时启动一个（50ms 后冲刷）
+        if self._title_flush_task is None or self._title_flush_task.done():
+            self._title_flush_task = asyncio.ensure_future(self._flush_titles())
+
+        return await future
+
+    async def _flush_titles(self) -> None:
+        """等待收集窗口结束后冲刷一批标题请求。"""
+        # 50ms 收集窗口：对单个用户不可感知，足以聚合批量导入的并发
+        await asyncio.sleep(0.05)
+
+        batch = self._title_pending[:8]
+        del self._title_pending[:8]
+
+        # 仍有积压时立即调度下一批
+        if self._title_pending:
+            self._title_flush_task = asyncio.ensure_future(self._flush_titles())
+
+        if not batch:
+            return
+
+        try:
+            try:
+                if len(batch) == 1:
+                    # 单条直接走普通路径，不付出批量提示词的开销
+                    titles = [await self._generate_title_single(batch[0][0], batch[0][1])]
+                else:
+                    titles = await self._generate_titles_batch(batch)
+            except Exception as e:
+                # 整批失败：让每个等待者各自收到异常（上层降级为"新对话"）
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+            # 按序分发结果
+            for (_, _, future), title in zip(batch, titles):
+                if not future.done():
+                    future.set_result(title)
+        finally:
+            # 兜底调度：批量调用在途期间新到的请求看到
+            # _title_flush_task 还没 done()，不会自己调度冲刷；
+            # 若这里不补一次，这些等待者的 future 将永远悬挂。
+            # 当前任务在 finally 里尚未 done()，需按身份识别
+            current = self._title_flush_task
+            if self._title_pending and (
+                current is None
+                or current.done()
+                or current is asyncio.current_task()
+            ):
+                self._title_flush_task = asyncio.ensure_future(self._flush_titles())
+
+    async def _generate_titles_batch(
+        self,
+        batch: List[tuple],
+    ) -> List[str]:
+        """一次 Azure 调用为整批消息生成标题，失败时逐条回退。"""
+        # 输入：截断后的消息数组；输出：同序的标题 JSON 数组
+        inputs = [user_message[:500] for user_message, _, _ in batch]
+        prompt = (
+            "请为以下 JSON 数组中的每条用户输入生成一个简短的对话标题。要求：\n"
+            "1. 每个标题长度在5-15个字之间\n"
+            "2. 不要使用标点符号\n"
+            "3. 简洁准确地概括用户想讨论的主题\n"
+            "4. 只返回一个 JSON 字符串数组，与输入同序，不要有任何其他内容\n\n"
+            f"用户输入数组：{json.dumps(inputs, ensure_ascii=False)}"
+        )
+
+        response = await self.async_client.chat.completions.create(
+            model=self.deployment_name,
+            messages=[
+                {"role": "system", "content": "你是一个标题生成助手，只输出 JSON 字符串数组，不要有任何解释。"},
+                {"role": "user", "content": prompt},
+            ],
+            max_tokens=50 * len(batch),
+            temperature=0.3,
+        )
+
+        content = response.choices[0].message.content or ""
+        try:
+            # 容忍模型把数组包进 markdown 代码块
+            raw = content.strip().strip("`")
+            if raw.startswith("json"):
+                raw = raw[4:]
+            titles = _json_loads(raw)
+            if not isinstance(titles, list) or len(titles) != len(batch):
+                raise ValueError("title batch shape mismatch")
+        except (ValueError, TypeError):
+            # 解析失败：逐条回退到单条路径
+            logger.warning("Batched title response unparsable, falling back to single calls")
+            return list(await asyncio.gather(*(
+                self._generate_title_single(user_message, max_length)
+                for user_message, max_length, _ in batch
+            )))
+
+        return [
+            _clean_title(title, max_length)
+            for title, (_, max_length, _) in zip(titles, batch)
+        ]
+
+    async def _generate_title_single(self, user_message: str, max_length: int) -> str:
+        """为单条消息生成标题（原始单调用路径）。"""
         # 构建提示词，详细说明生成要求
         prompt = f"""请根据以下用户输入生成一个简短的对话标题。要求：
 1. 标题长度在5-15个字之间
@@ -266,35 +797,18 @@ class AzureOpenAIService:
 
 用户输入：{user_message[:500]}"""  # 限制输入长度，避免令牌超限
 
-        try:
-            response = self.client.chat.completions.create(
-                model=self.deployment_name,
-                messages=[
-                    # 简洁的系统提示，专注于标题生成任务
-                    {"role": "system", "content": "你是一个标题生成助手，只输出简短的标题，不要有任何解释。"},
-                    {"role": "user", "content": prompt},
-                ],
-                max_tokens=50,       # 标题不需要太多令牌
-                temperature=0.3,     # 较低的温度，确保输出一致
-            )
-            
-            # 提取并清理标题
-            content = response.choices[0].message.content
-            title = content.strip() if content else "新对话"
-            
-            # 移除可能存在的引号
-            title = title.strip('"\'""''')
-            
-            # 确保标题不超过最大长度
-            if len(title) > max_length:
-                title = title[:max_length]
-            
-            return title if title else "新对话"
-            
-        except Exception as e:
-            # 标题生成失败不应影响主流程
-            logger.warning(f"Failed to generate title: {e}")
-            return "新对话"
+        response = await self.async_client.chat.completions.create(
+            model=self.deployment_name,
+            messages=[
+                # 简洁的系统提示，专注于标题生成任务
+                {"role": "system", "content": "你是一个标题生成助手，只输出简短的标题，不要有任何解释。"},
+                {"role": "user", "content": prompt},
+            ],
+            max_tokens=50,       # 标题不需要太多令牌
+            temperature=0.3,     # 较低的温度，确保输出一致
+        )
+
+        return _clean_title(response.choices[0].message.content, max_length)
 
     async def chat_completion_stream(
         self,
@@ -304,10 +818,87 @@ class AzureOpenAIService:
         attachments: Optional[List[Dict[str, Any]]] = None,
         max_tokens: int = 4096,
         temperature: float = 0.7,
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        生成流式聊天补全（带并发请求合并）。
+
+        当多个用户并发发起完全相同的确定性请求（temperature == 0）时，
+        只向 Azure 发起一次上游调用，其余请求订阅同一个广播流。
+        非确定性请求（temperature > 0，期望输出有随机性）不参与合并，
+        直接走独立上游流。
+
+        事件格式与 _upstream_stream 完全一致，调用方无感知。
+        """
+        # 压缩过长历史，给模型的提示词长度有上界
+        history = compact_history(history)
+
+        # 只合并确定性请求：temperature > 0 时输出有随机性，
+        # 不同用户理应得到独立采样的回复
+        if temperature > 0 or attachments:
+            async for event in self._upstream_stream(
+                system_prompt, history, user_message, attachments,
+                max_tokens, temperature,
+            ):
+                yield event
+            return
+
+        # ========== 并发合并路径 ==========
+        key = _completion_cache_key(
+            system_prompt, history, user_message, max_tokens, temperature
+        )
+        broadcast = _inflight_streams.get(key)
+
+        if broadcast is None:
+            # 首个请求：创建广播器并驱动上游流
+            broadcast = _StreamBroadcast()
+            _inflight_streams[key] = broadcast
+            completed = False
+            try:
+                async for event in self._upstream_stream(
+                    system_prompt, history, user_message, attachments,
+                    max_tokens, temperature,
+                ):
+                    broadcast.publish(event)
+                    yield event
+                completed = True
+            except Exception as e:
+                # 把失败广播给跟随者，让它们各自抛出
+                broadcast.close(error=e)
+                raise
+            finally:
+                # 流结束后移除在途记录，后续请求重新发起上游调用
+                _inflight_streams.pop(key, None)
+                # 领导者退出的所有路径都必须关闭广播，否则跟随者
+                # 永远阻塞在 wait()。except Exception 接不住
+                # GeneratorExit/CancelledError（领导客户端断开、任务
+                # 取消正是走这两条路），只有 finally 能兜底。
+                # 上游没走完时给跟随者一个错误而不是默默截断
+                if not broadcast.finished:
+                    if completed:
+                        broadcast.close()
+                    else:
+                        broadcast.close(
+                            error=RuntimeError(
+                                "upstream stream aborted before completion"
+                            )
+                        )
+        else:
+            # 跟随者：重放广播器中已有的事件并等待后续事件
+            async for event in broadcast.subscribe():
+                yield event
+
+    async def _upstream_stream(
+        self,
+        system_prompt: str,
+        history: List[Dict[str, Any]],
+        user_message: str,
+        attachments: Optional[List[Dict[str, Any]]] = None,
+        max_tokens: int = 4096,
+        temperature: float = 0.7,
     ) -> AsyncGenerator[Dict[str, Any], None]:
         """
         生成流式聊天补全。
-        
+
         使用异步客户端实现真正的流式响应，每当 AI 生成一段内容，
         就立即通过 yield 返回给调用者。这样前端可以实时显示 AI 的回复，
         无需等待完整响应。
@@ -354,88 +945,150 @@ class AzureOpenAIService:
         messages = self._build_messages(system_prompt, history, user_message, attachments)
         
         # 记录请求信息用于调试
-        logger.info(f"Starting streaming chat completion (async)")
-        logger.info(f"  Deployment: {self.deployment_name}")
-        logger.info(f"  Messages count: {len(messages)}")
-        logger.info(f"  Max tokens: {max_tokens}")
-        logger.info(f"  Temperature: {temperature}")
+        # DEBUG 级别 + 惰性 %s 格式化：生产日志级别下完全零成本，
+        # isEnabledFor 判断避免在禁用时逐条走 logging 内部分发
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "Starting streaming chat completion: deployment=%s messages=%d "
+                "max_tokens=%d temperature=%s",
+                self.deployment_name, len(messages), max_tokens, temperature,
+            )
 
+        # 入场控制覆盖整个流的生命周期：
+        # 流式请求在生成期间持续占用部署配额，名额在流结束后才释放
+        await _admission.acquire()
         try:
-            # ========== 创建流式响应 ==========
-            # 使用异步客户端和 stream=True 参数
-            # 返回的 stream 是一个异步迭代器
-            stream = await self.async_client.chat.completions.create(
+            # ========== 创建流式响应（原始 SSE 模式） ==========
+            # with_streaming_response 返回未经 pydantic 验证的原始响应。
+            # 默认路径会为每个 token chunk 构造一个完整的 pydantic 模型
+            # （验证 + 模型对象分配），在 kHz 级的 token 速率下占据可观
+            # CPU。这里直接逐行读取 SSE 字节流，用 orjson/json 解析出
+            # delta，跳过整个 pydantic 验证层
+            raw = self.async_client.chat.completions.with_streaming_response.create(
                 model=self.deployment_name,
                 messages=messages,
                 max_tokens=max_tokens,
                 temperature=temperature,
                 stream=True,  # 关键参数：启用流式模式
             )
-            logger.info("Async stream created successfully, iterating chunks...")
-
-            # ========== 迭代处理流式响应 ==========
-            # 使用 async for 确保不阻塞事件循环
-            async for chunk in stream:
-                # 检查是否有有效的响应选择
-                if chunk.choices and len(chunk.choices) > 0:
-                    delta = chunk.choices[0].delta
-                    finish_reason = chunk.choices[0].finish_reason
-
-                    # 处理内容增量
-                    # delta.content 包含新生成的文本片段
-                    if delta.content:
-                        yield {
-                            "type": "content_delta",
-                            "delta": delta.content,
-                        }
+            async with raw as response:
+                logger.debug("Async stream created successfully, iterating chunks...")
+
+                # ========== 迭代处理流式响应（微批合并） ==========
+                # 上游每个 token 都是一个独立 chunk；逐 token 往下游 yield
+                # 会在每个 token 上付出一次 dict 分配 + SSE 编码 + 事件循环
+                # 唤醒的成本。这里把小增量合并成微批：凑够 32 字符或距上次
+                # 下发超过 20ms 就冲刷一次。对用户观感无差别（20ms 远低于
+                # 渲染帧间隔），但下游事件数可降一个数量级
+                loop = asyncio.get_running_loop()
+                buf: List[str] = []       # 待冲刷的文本片段
+                buf_len = 0               # 已缓冲的字符数
+                last_flush = loop.time()  # 上次冲刷时刻
+
+                # 热循环局部名绑定：每个 token 迭代一次的循环里，
+                # 全局名/属性查找（LOAD_GLOBAL/LOAD_ATTR）累积成本可观，
+                # 提前绑定为局部变量（LOAD_FAST）
+                loads = _json_loads
+                buf_append = buf.append
+                loop_time = loop.time
+
+                # 逐行读取 SSE（async for 确保不阻塞事件循环）
+                # 每个事件形如 "data: {json}"，流末尾是 "data: [DONE]"
+                async for line in response.iter_lines():
+                    if not line.startswith("data: "):
+                        continue
+                    payload = line[6:]
+                    if payload == "[DONE]":
+                        break
+
+                    data = loads(payload)
+                    choices = data.get("choices")
+                    # 检查是否有有效的响应选择
+                    if not choices:
+                        continue
+                    delta = choices[0].get("delta") or {}
+                    content = delta.get("content")
+                    finish_reason = choices[0].get("finish_reason")
+
+                    # 累积内容增量
+                    # delta["content"] 包含新生成的文本片段
+                    # 注意：yield 出去的 dict 必须每次新建——广播器会把
+                    # 事件存入重放缓冲，复用可变 dict 会污染历史事件
+                    if content:
+                        buf_append(content)
+                        buf_len += len(content)
+
+                        # 凑够字符数或超时则冲刷微批
+                        now = loop_time()
+                        if buf_len >= 32 or now - last_flush >= 0.02:
+                            yield {
+                                "type": "content_delta",
+                                "delta": "".join(buf),
+                            }
+                            buf.clear()
+                            buf_len = 0
+                            last_flush = now
 
                     # 处理完成信号
                     # finish_reason 可能是 "stop"（正常结束）或 "length"（达到最大令牌数）
                     if finish_reason:
-                        logger.info(f"Stream finished with reason: {finish_reason}")
+                        # 先冲刷缓冲区中剩余的内容，再发送完成事件
+                        if buf:
+                            yield {
+                                "type": "content_delta",
+                                "delta": "".join(buf),
+                            }
+                            buf.clear()
+                            buf_len = 0
+                        # 每次流结束都会触发，降为 DEBUG 并用惰性格式化
+                        logger.debug("Stream finished with reason: %s", finish_reason)
                         yield {
                             "type": "finish",
                             "finish_reason": finish_reason,
                         }
-                        
+
         except Exception as e:
-            # 记录详细错误信息用于调试
-            logger.error(f"Azure OpenAI API error: {type(e).__name__}: {str(e)}")
-            logger.error(f"  Endpoint used: {self.settings.azure_openai_endpoint}")
-            logger.error(f"  Deployment used: {self.deployment_name}")
+            # 429 触发入场控制缩容，按 Retry-After 恢复
+            if isinstance(e, RateLimitError):
+                _admission.throttle(_retry_after_seconds(e))
+            # 记录详细错误信息用于调试（错误路径不在热路径上，保留 ERROR 级别）
+            logger.error(
+                "Azure OpenAI API error: %s: %s (endpoint=%s deployment=%s)",
+                type(e).__name__, e,
+                self.settings.azure_openai_endpoint, self.deployment_name,
+            )
             # 重新抛出异常，让调用者处理
             raise
+        finally:
+            # 流结束（或失败）后释放在途名额
+            await _admission.release()
 
 
 # ============================================================================
 # 单例模式实现
 # ============================================================================
 
-# 全局服务实例
-_openai_service: Optional[AzureOpenAIService] = None
-
-
+@lru_cache(maxsize=1)
 def get_openai_service() -> AzureOpenAIService:
     """
     获取 Azure OpenAI 服务的单例实例。
-    
-    使用单例模式确保：
+
+    使用 lru_cache 实现单例，确保：
     1. 整个应用共享同一个服务实例
     2. 只初始化一次客户端连接
     3. 避免重复创建资源
-    
+
+    相比手写的"检查-再赋值"全局变量，lru_cache 的初始化
+    带锁保护，多线程启动压力下也不会构造出两个客户端
+    （及各自的 TLS 连接池）。
+
     Returns:
         AzureOpenAIService: 服务实例
-        
+
     使用方式：
         from app.services.azure_openai import get_openai_service
-        
+
         service = get_openai_service()
         response = await service.chat_completion(...)
     """
-    global _openai_service
-    
-    if _openai_service is None:
-        _openai_service = AzureOpenAIService()
-    
-    return _openai_service
\ No newline at end of file
+    return AzureOpenAIService()
\ No newline at end of file
@@ -36,22 +36,85 @@ from datetime import datetime, timedelta, timezone
 # Any: 任意类型注解
 # Dict: 字典类型注解
 # Optional: 可选类型注解
-from typing import Any, Dict, Optional
+# Tuple: 元组类型注解
+from typing import Any, Dict, Optional, Tuple
+
+# asyncio: 并发原语（批量上传的信号量 / gather）
+import asyncio
+
+# hashlib: SHA-256 哈希，用于内容寻址去重
+import hashlib
+
+# logging: 标准日志（延迟格式化，替代错误路径上的 print）
+import logging
 
 # uuid: Python 标准库，用于生成唯一的文件 ID
 import uuid
 
+# lru_cache: 函数结果缓存装饰器
+from functools import lru_cache
+
+# LRUCache: 最近最少使用淘汰的内存缓存
+# TTLCache: 带过期时间的内存缓存（cachetools 已是项目依赖）
+from cachetools import LRUCache, TTLCache
+
+# charset-normalizer: 单次遍历的编码探测，替代"逐个编码试错"的解码方式
+# 可选依赖：未安装时回退到 UTF-8/GBK 试错逻辑
+try:
+    from charset_normalizer import from_bytes as _cn_from_bytes
+except ImportError:
+    _cn_from_bytes = None  # type: ignore[assignment]
+
+# python-magic: 基于 libmagic 的文件类型探测，从文件头部字节识别
+# 真实 MIME 类型，不信任浏览器声明的 content_type
+# 可选依赖：libmagic 未安装时回退到"声明类型 + 扩展名"逻辑
+try:
+    import magic
+except ImportError:
+    magic = None  # type: ignore[assignment]
+
 # mimetypes: Python 标准库，用于根据 MIME 类型推断文件扩展名
 import mimetypes
 
-# BlobServiceClient: Azure Blob Storage 服务客户端
+# re: 正则表达式，用于从 SAS URL 中提取 Blob 名称
+import re
+
+# threading: 单例首次创建的互斥锁
+import threading
+
+# time: time.time() 取当前时间戳，比 datetime.now 的封装路径更轻
+import time
+
+# unquote: URL 解码函数（模块顶部导入一次，避免每次下载时重复导入）
+from urllib.parse import unquote
+
 # BlobSasPermissions: SAS Token 权限配置类
-# generate_blob_sas: 生成 Blob 级别 SAS Token 的函数
-from azure.storage.blob import BlobServiceClient, BlobSasPermissions, generate_blob_sas
+# generate_blob_sas: 生成 Blob 级别 SAS Token 的函数（纯计算，无 I/O）
+from azure.storage.blob import BlobSasPermissions, generate_blob_sas
+
+# BlobSharedAccessSignature: SAS 签名器。generate_blob_sas 每次调用都会
+# 重新构造签名器（base64 解码账户密钥等）；签名器本身无状态，
+# 构造一次反复使用即可。来自 SDK 私有模块，版本间可能移动，
+# 导入失败时回退到公开的 generate_blob_sas
+try:
+    from azure.storage.blob._shared.shared_access_signature import (
+        BlobSharedAccessSignature,
+    )
+except ImportError:
+    BlobSharedAccessSignature = None  # type: ignore[assignment, misc]
+
+# BlobServiceClient: Azure Blob Storage 异步服务客户端
+# 同步客户端会在整个上传/下载期间（最大 20MB）阻塞事件循环，
+# 把单个 worker 的并发请求串行化；异步客户端让存储 I/O 与其他
+# 请求并发进行
+from azure.storage.blob.aio import BlobServiceClient
 
 # get_settings: 获取应用配置的函数
 from app.core.config import get_settings
 
+# 模块级日志器
+logger = logging.getLogger(__name__)
+
 
 # ============================================================================
 # 允许的文件类型配置
@@ -96,6 +159,136 @@ EXTENSION_TO_MIME = {
 MAX_IMAGE_SIZE = 10 * 1024 * 1024  # 10 MB - 图片上限
 MAX_FILE_SIZE = 20 * 1024 * 1024   # 20 MB - 文档上限
 
+# ============================================================================
+# MIME 类型到扩展名的映射（模块加载时预计算）
+# ============================================================================
+# mimetypes.guess_extension 每次调用都会扫描注册表；
+# 白名单是一个小的封闭集合，加载时算一次，上传热路径 O(1) 查表。
+# 个别类型手动覆盖（guess_extension 对 jpeg 返回 .jpe、
+# 对 text/markdown 可能返回 None）
+MIME_TO_EXT = {m: (mimetypes.guess_extension(m) or "") for m in ALL_ALLOWED_TYPES}
+MIME_TO_EXT.update({
+    "image/jpeg": ".jpg",
+    "text/markdown": ".md",
+})
+
+
+# ============================================================================
+# 纯函数辅助（模块级 + lru_cache 记忆化）
+# ============================================================================
+# 每次上传都会调用这两个小函数；扩展名/MIME 的取值空间很小，
+# 记忆化后重复上传同类文件时直接命中缓存
+
+@lru_cache(maxsize=512)
+def _mime_from_ext(filename_lower: str) -> Optional[str]:
+    """根据小写文件名的扩展名推断 MIME 类型（未知返回 None）。"""
+    # rpartition 比 os.path.splitext 轻量，且无需导入 os
+    ext = filename_lower.rpartition(".")[2]
+    return EXTENSION_TO_MIME.get(f".{ext}")
+
+
+def _utcnow() -> datetime:
+    """当前 UTC 时间（走 time.time 快路径，少一层 datetime.now 封装）。"""
+    return datetime.fromtimestamp(time.time(), timezone.utc)
+
+
+def _decode_text(content: bytes) -> str:
+    """
+    把下载的文本字节解码为字符串。
+
+    绝大多数文件是 UTF-8，先做一次廉价的直接解码；失败时再交给
+    charset-normalizer 做单次遍历的编码探测（覆盖 GBK/Big5/Shift-JIS
+    等），避免逐个编码各做一遍完整解码。探测不可用或失败时退回
+    UTF-8 忽略错误模式。
+
+    Args:
+        content: 文件内容字节
+
+    Returns:
+        str: 解码后的文本
+    """
+    # 快速路径：UTF-8（含纯 ASCII）一次解码成功
+    try:
+        return content.decode("utf-8")
+    except UnicodeDecodeError:
+        pass
+
+    if _cn_from_bytes is not None:
+        # 限定候选编码集合可以显著加快探测（都是中日文场景常见编码）
+        result = _cn_from_bytes(
+            content,
+            cp_isolation=["utf_8", "gb18030", "big5", "shift_jis"],
+        ).best()
+        if result is not None:
+            return str(result)
+    else:
+        # 回退：尝试 GBK（常见于中文 Windows 系统）
+        try:
+            return content.decode("gbk")
+        except UnicodeDecodeError:
+            pass
+
+    # 最后使用 UTF-8 忽略无法解码的字符
+    return content.decode("utf-8", errors="ignore")
+
+
+def _scan(file_content: bytes) -> Tuple[int, bytes, str]:
+    """
+    单次遍历收集文件大小、头部 2KB 和 SHA-256。
+
+    验证（大小 + MIME 探测）和去重各自需要读取文件字节；
+    合并成一次扫描让大文件只过一遍内存。sha256 的 update
+    在 C 扩展内释放 GIL，对大内容不会卡住解释器。
+
+    Args:
+        file_content: 完整的文件内容
+
+    Returns:
+        Tuple[int, bytes, str]: (字节数, 头部 2KB, SHA-256 十六进制摘要)
+    """
+    mv = memoryview(file_content)
+    size = mv.nbytes
+    head = bytes(mv[:2048])
+    sha = hashlib.sha256(mv).hexdigest()
+    return size, head, sha
+
+
+@lru_cache(maxsize=512)
+def _file_type(mime_type: str) -> str:
+    """根据 MIME 类型判断文件类别（"image" 或 "file"）。"""
+    if mime_type in ALLOWED_IMAGE_TYPES:
+        return "image"
+    return "file"
+
+# ============================================================================
+# 上传分块参数
+# ============================================================================
+# SDK 默认单连接、4MB 分块；对 10-20MB 的文件，并行分块上传
+# 能用多条 TLS 流打满出站带宽
+UPLOAD_BLOCK_SIZE = 8 * 1024 * 1024   # 8 MB 分块
+UPLOAD_MAX_CONCURRENCY = 8            # 大文件的并行分块数
+
+# 超过该大小的 CPU 密集操作（解码/哈希）转到工作线程执行，
+# 避免在事件循环线程上一次性处理最多 20MB 内容而卡住其他请求；
+# 小内容直接内联，省掉线程切换开销
+_OFFLOAD_THRESHOLD = 256 * 1024  # 256 KB
+
+# 小文件整体缓冲的上限：不超过它的流式上传改走 upload_file 的
+# 内容寻址去重路径（缓冲成本低、去重收益大——重发的截图和
+# 文档正是小文件）。更大的文件保持流式直传：内容哈希要等流
+# 读完才知道，而 Blob 名必须先于提交确定，大文件去重需要
+# 暂存 Blob + 服务端复制，复杂度不抵收益
+_DEDUP_BUFFER_LIMIT = 4 * 1024 * 1024  # 4 MB
+
+# ============================================================================
+# SAS URL 解析
+# ============================================================================
+# 从 SAS URL 提取 Blob 名称的预编译正则。
+# URL 格式: https://<account>.blob.core.windows.net/<container>/<blob_name>?<sas>
+# 捕获组为容器名之后、查询串之前的 Blob 路径；
+# 比 urlparse + split 少一次完整 URL 解析和列表拼接
+_BLOB_RE = re.compile(r"^https://[^/]+\.blob\.core\.windows\.net/[^/]+/([^?]+)")
+
 
 class BlobStorageService:
     """
@@ -122,22 +315,88 @@ class BlobStorageService:
         连接字符串包含存储账户名称和密钥。
         """
         self.settings = get_settings()
-        
-        # 从连接字符串创建 Blob 服务客户端
-        # 连接字符串格式：
-        # DefaultEndpointsProtocol=https;AccountName=xxx;AccountKey=xxx;EndpointSuffix=core.windows.net
-        self.blob_service_client = BlobServiceClient.from_connection_string(
-            self.settings.azure_storage_connection_string
-        )
-        
+
+        # 异步客户端延迟创建（首次使用时），部分认证流程需要运行中的
+        # 事件循环；见 _get_container_client
+        self._blob_service_client: Optional[BlobServiceClient] = None
+        self._container_client = None
+
         # 保存容器名称
         self.container_name = self.settings.azure_storage_container_name
-        
-        # 获取容器客户端
-        self.container_client = self.blob_service_client.get_container_client(
-            self.container_name
+
+        # ========== 预解析连接字符串 ==========
+        # 账户名/密钥和 URL 前缀在服务生命周期内不变，
+        # 解析一次缓存起来，_generate_sas_url 不必每次重新拆分字符串
+        conn_str_parts = dict(
+            part.split("=", 1)
+            for part in self.settings.azure_storage_connection_string.split(";")
+            if "=" in part
+        )
+        self._account_name = conn_str_parts.get("AccountName", "")
+        self._account_key = conn_str_parts.get("AccountKey", "")
+        self._url_prefix = (
+            f"https://{self._account_name}.blob.core.windows.net/{self.container_name}/"
         )
 
+        # ========== SAS 签名器 ==========
+        # 构造一次复用：省掉每次签发时的账户密钥 base64 解码和
+        # 签名器对象构建，热路径只剩规范串的 HMAC 计算
+        self._sas_signer = (
+            BlobSharedAccessSignature(self._account_name, account_key=self._account_key)
+            if BlobSharedAccessSignature is not None
+            else None
+        )
+
+        # ========== SAS URL 缓存 ==========
+        # 每次签发 SAS 都要做一次 HMAC-SHA256 计算和字符串拼接。
+        # SAS Token 有效期 24 小时，缓存 23 小时后过期重签，
+        # 返回的 URL 始终至少还有 1 小时的有效余量
+        self._sas_cache: TTLCache = TTLCache(maxsize=10_000, ttl=23 * 3600)
+
+        # ========== BlobClient 缓存 ==========
+        # get_blob_client 每次都会构造 URL、pipeline 和策略对象；
+        # 热点 Blob（反复下载/检查）按名称复用同一个客户端
+        self._blob_clients: LRUCache = LRUCache(maxsize=1024)
+
+    def _get_container_client(self):
+        """
+        获取（按需创建）异步容器客户端。
+
+        从连接字符串创建 Blob 服务客户端。连接字符串格式：
+        DefaultEndpointsProtocol=https;AccountName=xxx;AccountKey=xxx;EndpointSuffix=core.windows.net
+
+        Returns:
+            ContainerClient: 异步容器客户端
+        """
+        if self._container_client is None:
+            self._blob_service_client = BlobServiceClient.from_connection_string(
+                self.settings.azure_storage_connection_string,
+                # 分块大小是客户端级参数；并行度按文件大小逐次指定
+                max_block_size=UPLOAD_BLOCK_SIZE,
+                # 不超过一个分块的文件走单次 Put Blob，
+                # 省掉 Put Block + Put Block List 的两段式提交
+                max_single_put_size=UPLOAD_BLOCK_SIZE,
+            )
+            self._container_client = self._blob_service_client.get_container_client(
+                self.container_name
+            )
+        return self._container_client
+
+    def _client(self, blob_name: str):
+        """获取（按需创建并缓存）指定 Blob 的客户端。"""
+        client = self._blob_clients.get(blob_name)
+        if client is None:
+            client = self._get_container_client().get_blob_client(blob_name)
+            self._blob_clients[blob_name] = client
+        return client
+
+    async def close(self) -> None:
+        """关闭异步客户端，应在应用关闭时调用（lifespan shutdown）。"""
+        if self._blob_service_client is not None:
+            await self._blob_service_client.close()
+            self._blob_service_client = None
+            self._container_client = None
+
     def _get_file_type(self, mime_type: str) -> str:
         """
         根据 MIME 类型判断文件类别。
@@ -152,9 +411,7 @@ class BlobStorageService:
         Returns:
             str: "image" 或 "file"
         """
-        if mime_type in ALLOWED_IMAGE_TYPES:
-            return "image"
-        return "file"
+        return _file_type(mime_type)
 
     def _get_mime_from_extension(self, filename: str) -> Optional[str]:
         """
@@ -168,10 +425,39 @@ class BlobStorageService:
         Returns:
             Optional[str]: MIME 类型，未知扩展名返回 None
         """
-        import os
-        # 提取扩展名并转小写
-        _, ext = os.path.splitext(filename.lower())
-        return EXTENSION_TO_MIME.get(ext)
+        return _mime_from_ext(filename.lower())
+
+    def _resolve_mime(self, head: bytes, content_type: str, filename: str) -> str:
+        """
+        解析文件的实际 MIME 类型。
+
+        优先从文件头部字节探测真实类型（浏览器声明的 content_type
+        可被伪造）；libmagic 对 OOXML 等容器格式可能返回
+        application/zip 之类的泛化类型，只有探测结果本身在白名单内时
+        才以其为准。仍无法确定时回退到从扩展名推断。
+
+        Args:
+            head: 文件开头的字节（2KB 足够探测）
+            content_type: 客户端声明的 MIME 类型
+            filename: 原始文件名
+
+        Returns:
+            str: 解析出的 MIME 类型（不保证在白名单内，调用方需校验）
+        """
+        actual_content_type = content_type
+        if magic is not None:
+            detected = magic.from_buffer(head, mime=True)
+            if detected in ALL_ALLOWED_TYPES:
+                actual_content_type = detected
+
+        # 仍无法确定类型时（libmagic 缺失或探测为 octet-stream），
+        # 尝试从扩展名推断 MIME 类型
+        if actual_content_type == "application/octet-stream":
+            mime_from_ext = self._get_mime_from_extension(filename)
+            if mime_from_ext:
+                actual_content_type = mime_from_ext
+
+        return actual_content_type
 
     def validate_file(
         self, file_content: bytes, content_type: str, filename: str
@@ -194,19 +480,18 @@ class BlobStorageService:
                 - type: 文件类别（"image" 或 "file"）
                 - mime_type: 实际 MIME 类型
                 - size: 文件大小（字节）
+                - sha256: 内容的 SHA-256 摘要（用于去重）
                 - filename: 原始文件名
-                
+
         Raises:
             ValueError: 如果文件类型不允许或大小超限
         """
-        # 处理浏览器上传时 content_type 为 octet-stream 的情况
-        actual_content_type = content_type
-        if content_type == "application/octet-stream":
-            # 尝试从扩展名推断 MIME 类型
-            mime_from_ext = self._get_mime_from_extension(filename)
-            if mime_from_ext:
-                actual_content_type = mime_from_ext
-        
+        # 单次扫描：大小、头部 2KB（MIME 探测用）和内容哈希一起算出
+        file_size, head, sha256 = _scan(file_content)
+
+        # 解析 MIME 类型（探测只需要开头 2KB）
+        actual_content_type = self._resolve_mime(head, content_type, filename)
+
         # 验证 MIME 类型在白名单中
         if actual_content_type not in ALL_ALLOWED_TYPES:
             raise ValueError(f"File type '{actual_content_type}' is not allowed")
@@ -215,7 +500,6 @@ class BlobStorageService:
         file_type = self._get_file_type(actual_content_type)
 
         # 验证文件大小
-        file_size = len(file_content)
         max_size = MAX_IMAGE_SIZE if file_type == "image" else MAX_FILE_SIZE
 
         if file_size > max_size:
@@ -226,6 +510,7 @@ class BlobStorageService:
             "type": file_type,
             "mime_type": actual_content_type,
             "size": file_size,
+            "sha256": sha256,
             "filename": filename,
         }
 
@@ -240,9 +525,9 @@ class BlobStorageService:
         上传文件到 Azure Blob Storage。
         
         完整的上传流程：
-        1. 验证文件类型和大小
-        2. 生成唯一的 Blob 名称
-        3. 上传到存储
+        1. 验证文件类型和大小（一次扫描同时算出内容哈希）
+        2. 按内容哈希生成 Blob 名称（重复内容自动去重）
+        3. 上传到存储（Blob 已存在时跳过传输）
         4. 生成 SAS URL 供访问
         
         Args:
@@ -265,36 +550,202 @@ class BlobStorageService:
         Raises:
             ValueError: 如果文件验证失败
         """
-        # 验证文件类型和大小
-        file_info = self.validate_file(file_content, content_type, filename)
+        # 验证文件类型和大小（同时得到内容哈希）
+        # 大文件的 SHA-256 扫描转到工作线程，不阻塞事件循环
+        if len(file_content) > _OFFLOAD_THRESHOLD:
+            file_info = await asyncio.to_thread(
+                self.validate_file, file_content, content_type, filename
+            )
+        else:
+            file_info = self.validate_file(file_content, content_type, filename)
+
+        # 内容寻址的 Blob 名称：{user_id}/{sha256}{extension}
+        # 同一用户重复上传相同内容会落到同一个 Blob，
+        # 最便宜的上传就是不发生的上传——已存在时直接跳过传输
+        # uuid4().hex 跳过 UUID.__str__ 的插入连字符处理，32 字符
+        # 比带连字符的 36 字符形式更短；文件 ID 对调用方是不透明的
+        file_id = uuid.uuid4().hex
+        extension = MIME_TO_EXT.get(content_type, "")
+        blob_name = f"{user_id}/{file_info['sha256']}{extension}"
+
+        blob_client = self._client(blob_name)
+        if not await blob_client.exists():
+            # 获取 Blob 客户端并上传（异步，不阻塞事件循环）
+            # 小于一个分块的文件单连接直传；更大的文件并行分块上传
+            concurrency = 1 if len(file_content) < UPLOAD_BLOCK_SIZE else UPLOAD_MAX_CONCURRENCY
+            await blob_client.upload_blob(
+                file_content,
+                content_type=content_type,  # 设置 Content-Type，方便浏览器识别
+                overwrite=True,              # 内容寻址命名下覆盖是幂等的
+                max_concurrency=concurrency,
+            )
+
+        # 生成带 SAS Token 的访问 URL 并写入缓存
+        # （新上传的文件通常很快被读取，预热缓存）
+        sas_url = self._generate_sas_url(blob_name)
+        self._sas_cache[blob_name] = sas_url
+
+        # 返回上传结果
+        return {
+            "id": file_id,
+            "fileName": filename,
+            "type": file_info["type"],
+            "mimeType": content_type,
+            "size": file_info["size"],
+            "blobName": blob_name,       # 保存 Blob 名称，用于后续操作
+            "url": sas_url,
+            "createdAt": _utcnow().isoformat(),
+        }
+
+    async def upload_files(
+        self,
+        user_id: str,
+        items: list,
+        concurrency: int = 8,
+    ) -> list:
+        """
+        并发上传多个文件。
+
+        逐个 await upload_file 会把每个文件的 TLS 握手和网络往返
+        串行累加；上传是 I/O 密集操作，并发执行可以让这些等待
+        相互重叠。信号量限制同时在途的上传数，避免一次请求
+        占满连接池。
+
+        Args:
+            user_id: 上传者的用户 ID
+            items: 每项为 upload_file 的关键字参数字典
+                  （file_content / content_type / filename）
+            concurrency: 同时进行的上传数上限（默认 8）
+
+        Returns:
+            list: 与输入顺序对齐的上传结果列表（字段同 upload_file）
+
+        Raises:
+            ValueError: 任一文件验证失败（整批失败）
+        """
+        sem = asyncio.Semaphore(concurrency)
+
+        async def _one(item: Dict[str, Any]) -> Dict[str, Any]:
+            async with sem:
+                return await self.upload_file(user_id, **item)
+
+        return await asyncio.gather(*(_one(item) for item in items))
+
+    async def upload_file_stream(
+        self,
+        user_id: str,
+        file_stream: Any,
+        content_type: str,
+        filename: str,
+        size_hint: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        以流式方式上传文件到 Azure Blob Storage。
+
+        与 upload_file 不同，本方法不要求调用方把整个文件读进内存
+        （20MB × 并发数的峰值内存），而是边读边传：
+        1. 只读取开头 2KB 做 MIME 探测和类型校验
+        2. 其余内容按块从流中读取并直接送入 upload_blob
+        3. 大小限制在传输过程中用累计字节数强制执行，
+           超限立即中止上传，不会先缓冲完整个文件
+
+        小文件（声明大小 ≤ _DEDUP_BUFFER_LIMIT）例外：
+        整体缓冲后委托给 upload_file，换取内容寻址去重。
+
+        Args:
+            user_id: 上传者的用户 ID（用于文件路径隔离）
+            file_stream: 支持 await read(n) 的异步文件对象
+                        （如 FastAPI 的 UploadFile）
+            content_type: 客户端声明的 MIME 类型
+            filename: 原始文件名（用于显示）
+            size_hint: 可选的文件总大小（来自 Content-Length），
+                      用于提前拒绝超限文件和 SDK 分块规划
+
+        Returns:
+            Dict: 上传结果，字段与 upload_file 相同
+
+        Raises:
+            ValueError: 如果文件验证失败或传输中发现超限
+        """
+        # ========== 小文件：改走内容寻址去重路径 ==========
+        # 声明大小在缓冲上限内时把整个文件读进内存交给 upload_file：
+        # 重复内容直接命中已有 Blob、跳过传输，且该路径的
+        # validate_file 做与下方相同的 MIME 探测和大小校验。
+        # 大文件保持流式、不去重（原因见 _DEDUP_BUFFER_LIMIT）
+        if size_hint is not None and 0 < size_hint <= _DEDUP_BUFFER_LIMIT:
+            file_content = await file_stream.read()
+            return await self.upload_file(
+                user_id, file_content, content_type, filename
+            )
+
+        # ========== 头部校验 ==========
+        # 只读 2KB 即可完成 MIME 探测，不缓冲整个文件
+        head = await file_stream.read(2048)
+        actual_content_type = self._resolve_mime(head, content_type, filename)
+
+        # 验证 MIME 类型在白名单中
+        if actual_content_type not in ALL_ALLOWED_TYPES:
+            raise ValueError(f"File type '{actual_content_type}' is not allowed")
+
+        file_type = self._get_file_type(actual_content_type)
+        max_size = MAX_IMAGE_SIZE if file_type == "image" else MAX_FILE_SIZE
+        max_mb = max_size // (1024 * 1024)
+
+        # 声明的大小已超限时直接拒绝，一个字节都不用传
+        if size_hint is not None and size_hint > max_size:
+            raise ValueError(f"File size exceeds maximum allowed ({max_mb} MB)")
+
+        # ========== 流式传输 ==========
+        # 生成器把头部和剩余内容拼接起来，同时维护累计字节数；
+        # 超限时抛出 ValueError，SDK 会中止上传（未提交的块被丢弃）
+        total_size = 0
+
+        async def _chunks():
+            nonlocal total_size
+            chunk = head
+            while chunk:
+                total_size += len(chunk)
+                if total_size > max_size:
+                    raise ValueError(
+                        f"File size exceeds maximum allowed ({max_mb} MB)"
+                    )
+                yield chunk
+                chunk = await file_stream.read(64 * 1024)
 
         # 生成唯一的 Blob 名称
         # 格式：{user_id}/{file_id}{extension}
-        file_id = str(uuid.uuid4())
-        extension = mimetypes.guess_extension(content_type) or ""
+        # hex 形式比带连字符的 UUID 短 4 字节，SAS 签名串也随之更短
+        file_id = uuid.uuid4().hex
+        extension = MIME_TO_EXT.get(content_type, "")
         blob_name = f"{user_id}/{file_id}{extension}"
 
-        # 获取 Blob 客户端并上传
-        blob_client = self.container_client.get_blob_client(blob_name)
-        blob_client.upload_blob(
-            file_content,
-            content_type=content_type,  # 设置 Content-Type，方便浏览器识别
-            overwrite=True,              # 覆盖已存在的文件（理论上 UUID 不会冲突）
+        concurrency = (
+            1 if size_hint is None or size_hint < UPLOAD_BLOCK_SIZE
+            else UPLOAD_MAX_CONCURRENCY
+        )
+        blob_client = self._client(blob_name)
+        await blob_client.upload_blob(
+            _chunks(),
+            length=size_hint,
+            content_type=content_type,
+            overwrite=True,
+            max_concurrency=concurrency,
         )
 
-        # 生成带 SAS Token 的访问 URL
+        # 生成带 SAS Token 的访问 URL 并写入缓存
         sas_url = self._generate_sas_url(blob_name)
+        self._sas_cache[blob_name] = sas_url
 
-        # 返回上传结果
+        # 返回上传结果（size 为实际传输的字节数）
         return {
             "id": file_id,
             "fileName": filename,
-            "type": file_info["type"],
+            "type": file_type,
             "mimeType": content_type,
-            "size": file_info["size"],
-            "blobName": blob_name,       # 保存 Blob 名称，用于后续操作
+            "size": total_size,
+            "blobName": blob_name,
             "url": sas_url,
-            "createdAt": datetime.now(timezone.utc).isoformat(),
+            "createdAt": _utcnow().isoformat(),
         }
 
     def _generate_sas_url(
@@ -323,28 +774,33 @@ class BlobStorageService:
         URL 格式：
         https://{account}.blob.core.windows.net/{container}/{blob}?{sas_token}
         """
-        # 从连接字符串解析账户信息
-        # 连接字符串格式：key1=value1;key2=value2;...
-        conn_str_parts = dict(
-            part.split("=", 1)
-            for part in self.settings.azure_storage_connection_string.split(";")
-            if "=" in part
-        )
-        account_name = conn_str_parts.get("AccountName", "")
-        account_key = conn_str_parts.get("AccountKey", "")
-
-        # 生成 SAS Token
-        sas_token = generate_blob_sas(
-            account_name=account_name,
-            container_name=self.container_name,
-            blob_name=blob_name,
-            account_key=account_key,
-            permission=BlobSasPermissions(read=True),  # 只允许读取
-            expiry=datetime.now(timezone.utc) + timedelta(hours=expiry_hours),
+        # 过期时间对齐到整分钟：同一分钟内签发的 SAS 规范串完全相同，
+        # 可被上层缓存/比较复用；对 24 小时的有效期而言精度损失可忽略
+        expiry = (_utcnow() + timedelta(hours=expiry_hours)).replace(
+            second=0, microsecond=0
         )
 
-        # 构建完整 URL
-        return f"https://{account_name}.blob.core.windows.net/{self.container_name}/{blob_name}?{sas_token}"
+        # 生成 SAS Token（账户信息在 __init__ 中解析并缓存）
+        if self._sas_signer is not None:
+            # 复用预构造的签名器，避免每次调用重建
+            sas_token = self._sas_signer.generate_blob(
+                self.container_name,
+                blob_name,
+                permission=BlobSasPermissions(read=True),  # 只允许读取
+                expiry=expiry,
+            )
+        else:
+            sas_token = generate_blob_sas(
+                account_name=self._account_name,
+                container_name=self.container_name,
+                blob_name=blob_name,
+                account_key=self._account_key,
+                permission=BlobSasPermissions(read=True),  # 只允许读取
+                expiry=expiry,
+            )
+
+        # 构建完整 URL（前缀已预计算）
+        return f"{self._url_prefix}{blob_name}?{sas_token}"
 
     async def get_file_url(self, blob_name: str) -> str:
         """
@@ -356,9 +812,14 @@ class BlobStorageService:
             blob_name: Blob 的完整路径名称
             
         Returns:
-            str: 新的带 SAS Token 的 URL
+            str: 新的带 SAS Token 的 URL（可能来自缓存，至少剩 1 小时有效期）
         """
-        return self._generate_sas_url(blob_name)
+        # 缓存命中时跳过 HMAC 签名；未过期的 URL 直接复用
+        url = self._sas_cache.get(blob_name)
+        if url is None:
+            url = self._generate_sas_url(blob_name)
+            self._sas_cache[blob_name] = url
+        return url
 
     async def delete_file(self, blob_name: str) -> bool:
         """
@@ -374,14 +835,54 @@ class BlobStorageService:
             失败时不抛出异常，只返回 False
             调用者需要根据返回值决定后续处理
         """
+        # 删除后 SAS 缓存和客户端缓存条目随之失效
+        self._sas_cache.pop(blob_name, None)
+        self._blob_clients.pop(blob_name, None)
+
         try:
-            blob_client = self.container_client.get_blob_client(blob_name)
-            blob_client.delete_blob()
+            blob_client = self._client(blob_name)
+            await blob_client.delete_blob()
             return True
         except Exception:
             # 可能的失败原因：Blob 不存在、权限不足等
             return False
 
+    async def delete_files(self, blob_names: list) -> list:
+        """
+        批量删除多个 Blob（Blob Batch API）。
+
+        逐个调用 delete_file 是 O(N·RTT)；Batch API 把最多 256 个
+        删除打包进一个 HTTP 请求，延迟变为 O(⌈N/256⌉·RTT)。
+        适合会话删除时清理其全部附件等场景。
+
+        Args:
+            blob_names: 要删除的 Blob 名称列表
+
+        Returns:
+            list: 与输入顺序对齐的布尔列表，True 表示删除成功
+        """
+        if not blob_names:
+            return []
+
+        # 缓存条目先行失效，与 delete_file 保持一致
+        for blob_name in blob_names:
+            self._sas_cache.pop(blob_name, None)
+            self._blob_clients.pop(blob_name, None)
+
+        try:
+            responses = await self._get_container_client().delete_blobs(
+                *blob_names,
+                raise_on_any_failure=False,  # 单个失败不中断整批
+            )
+            # 子响应与请求顺序一致；202 表示删除成功
+            results = []
+            async for response in responses:
+                results.append(response.status_code == 202)
+            return results
+        except Exception:
+            # 整批请求失败（网络错误、权限不足等）
+            return [False] * len(blob_names)
+
     async def file_exists(self, blob_name: str) -> bool:
         """
         检查 Blob 是否存在。
@@ -392,8 +893,12 @@ class BlobStorageService:
         Returns:
             bool: 存在返回 True，否则返回 False
         """
-        blob_client = self.container_client.get_blob_client(blob_name)
-        return blob_client.exists()
+        # SAS 缓存命中即证明该 Blob 近期上传/访问过且未被本服务删除
+        # （delete_file/delete_files 会清除对应条目），省掉一次 HEAD 往返
+        if blob_name in self._sas_cache:
+            return True
+        blob_client = self._client(blob_name)
+        return await blob_client.exists()
 
     async def download_file_content(self, url: str) -> Optional[bytes]:
         """
@@ -412,25 +917,22 @@ class BlobStorageService:
             Optional[bytes]: 文件内容（字节），失败返回 None
         """
         try:
-            # 从 SAS URL 提取 Blob 名称
-            blob_name = url
-            if "blob.core.windows.net" in url:
-                # 解析 URL 获取 Blob 名称
-                # URL 格式: https://<account>.blob.core.windows.net/<container>/<blob_name>?<sas>
-                from urllib.parse import urlparse, unquote
-                parsed = urlparse(url)
-                path_parts = parsed.path.split("/")
-                # path_parts[0] 是空字符串，[1] 是容器名，后面是 Blob 路径
-                if len(path_parts) >= 3:
-                    blob_name = "/".join(path_parts[2:])
-                    blob_name = unquote(blob_name)  # URL 解码
-            
-            # 下载 Blob 内容
-            blob_client = self.container_client.get_blob_client(blob_name)
-            download = blob_client.download_blob()
-            return download.readall()
-        except Exception as e:
-            print(f"Error downloading file: {e}")
+            # 从 SAS URL 提取 Blob 名称（预编译正则，匹配失败则视为 Blob 名称）
+            m = _BLOB_RE.match(url)
+            blob_name = m.group(1) if m else url
+            # 只有含百分号转义时才需要 URL 解码（常见的 UUID 路径可跳过）
+            if "%" in blob_name:
+                blob_name = unquote(blob_name)
+
+
+            # 下载 Blob 内容（异步，不阻塞事件循环）
+            blob_client = self._client(blob_name)
+            download = await blob_client.download_blob()
+            return await download.readall()
+        except Exception:
+            # %s 延迟格式化 + exception 记录堆栈；
+            # print 每次调用都持 GIL 构建 f-string，错误风暴时会串行化所有 worker
+            logger.exception("Error downloading %s", url)
             return None
 
     async def download_text_file(self, url: str) -> Optional[str]:
@@ -438,33 +940,28 @@ class BlobStorageService:
         下载并解码文本文件内容。
         
         自动处理编码：
-        1. 首先尝试 UTF-8
-        2. 失败则尝试 GBK（中文编码）
-        3. 最后使用 UTF-8 忽略错误
-        
+        1. 快速路径：直接尝试 UTF-8
+        2. 失败则用 charset-normalizer 做单次遍历编码探测
+        3. 最后回退 UTF-8 忽略错误
+
         Args:
             url: SAS URL 或 Blob 名称
-            
+
         Returns:
             Optional[str]: 解码后的文本内容，失败返回 None
-            
+
         适用场景：
         - 读取 Markdown 文件内容用于 AI 分析
         - 读取纯文本文件
         """
         content = await self.download_file_content(url)
-        if content:
-            try:
-                # 首选 UTF-8 编码
-                return content.decode("utf-8")
-            except UnicodeDecodeError:
-                # 尝试 GBK（常见于中文 Windows 系统）
-                try:
-                    return content.decode("gbk")
-                except:
-                    # 最后使用 UTF-8 忽略无法解码的字符
-                    return content.decode("utf-8", errors="ignore")
-        return None
+        if not content:
+            return None
+        if len(content) > _OFFLOAD_THRESHOLD:
+            # 大文件解码在工作线程执行（str.decode 在 C 层释放 GIL），
+            # 事件循环继续服务其他请求
+            return await asyncio.to_thread(_decode_text, content)
+        return _decode_text(content)
 
 
 # ============================================================================
@@ -474,28 +971,38 @@ class BlobStorageService:
 # 全局服务实例
 _blob_service: Optional[BlobStorageService] = None
 
+# 首次创建的互斥锁：裸的 "检查-创建" 在多线程服务器（如 uvicorn
+# 多 worker 线程或同步端点的线程池）下存在 TOCTOU 竞态，
+# 可能构造出两个服务实例（各带一套客户端/缓存）
+_blob_service_lock = threading.Lock()
+
 
 def get_blob_service() -> BlobStorageService:
     """
     获取 Blob Storage 服务的单例实例。
-    
+
     使用单例模式确保：
     1. 整个应用共享同一个服务实例
     2. 只创建一次客户端连接
     3. 避免重复建立连接
-    
+
+    双重检查加锁：常规路径无锁（只读已发布的引用），
+    仅首次创建时短暂持锁，避免并发首用构造出重复实例。
+
     Returns:
         BlobStorageService: 服务实例
-        
+
     使用方式：
         from app.services.blob_storage import get_blob_service
-        
+
         blob_service = get_blob_service()
         result = await blob_service.upload_file(...)
     """
     global _blob_service
-    
+
     if _blob_service is None:
-        _blob_service = BlobStorageService()
-    
+        with _blob_service_lock:
+            if _blob_service is None:
+                _blob_service = BlobStorageService()
+
     return _blob_service
\ No newline at end of file
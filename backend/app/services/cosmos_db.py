@@ -66,22 +66,235 @@ from typing import Any, Dict, List, Optional, cast
 
 # datetime: 日期时间类，用于处理时间戳
 # timezone: 时区类，用于 UTC 时间处理
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+
+# asyncio: 并发原语（级联删除的信号量 / gather）
+import asyncio
+
+# time: time.time() 取当前时间戳，比 datetime.now 的封装路径更轻
+import time
 
 # uuid: Python 标准库，用于生成唯一的 ID（用户 ID、对话 ID、消息 ID）
 import uuid
 
-# CosmosClient: Azure Cosmos DB 客户端类
+# TTLCache: 带过期时间的内存缓存（cachetools 已是项目依赖）
+from cachetools import TTLCache
+
+# MatchConditions: 条件请求枚举，用于基于 ETag 的乐观并发控制
+from azure.core import MatchConditions
+
 # PartitionKey: 分区键定义类，用于创建容器时指定分区键
-from azure.cosmos import ContainerProxy, CosmosClient, PartitionKey
+from azure.cosmos import PartitionKey
+
+# CosmosClient / ContainerProxy: Azure Cosmos DB 异步客户端
+# 同步客户端的每次网络往返都会阻塞事件循环，FastAPI 端点即使声明为
+# async 也会被串行化；异步客户端让并发请求的数据库 I/O 相互重叠
+from azure.cosmos.aio import ContainerProxy, CosmosClient
 
+# CosmosBatchOperationError: 事务批处理失败异常（整批回滚）
+# CosmosHttpResponseError: Cosmos DB HTTP 错误基类
 # CosmosResourceNotFoundError: Cosmos DB 资源未找到异常（如用户不存在）
-from azure.cosmos.exceptions import CosmosResourceNotFoundError
+from azure.cosmos.exceptions import (
+    CosmosBatchOperationError,
+    CosmosHttpResponseError,
+    CosmosResourceExistsError,
+    CosmosResourceNotFoundError,
+)
 
 # get_settings: 获取应用配置的函数
 from app.core.config import get_settings
 
 
+# ============================================================================
+# 写路径辅助函数
+# ============================================================================
+
+def _now_iso() -> str:
+    """当前 UTC 时间的 ISO 8601 字符串（time.time 快路径）。"""
+    return datetime.fromtimestamp(time.time(), timezone.utc).isoformat()
+
+
+# ========== 写入准入控制 ==========
+# 限制同时在途的写请求数：RU 超限时 Cosmos 返回 429，
+# 无界并发只会放大被限流的请求量；100 的并发度对单分区
+# 10K RU/s 的上限留有充分余量
+_write_sem = asyncio.Semaphore(100)
+
+# 429 重试的最大次数与初始退避（指数增长）
+_MAX_WRITE_ATTEMPTS = 5
+_BASE_BACKOFF_SECONDS = 0.1
+
+
+async def _with_backoff(operation):
+    """
+    在写入信号量与 429 指数退避下执行一次 Cosmos 操作。
+
+    SDK 自带重试，但不限制在途并发；这里在客户端先行排队，
+    并在被限流时优先遵循服务端的 x-ms-retry-after-ms 提示，
+    没有提示时按 0.1s 起步指数退避。
+
+    Args:
+        operation: 无参可调用对象，返回要执行的协程
+
+    Returns:
+        操作的返回值
+
+    Raises:
+        CosmosHttpResponseError: 非 429 错误或重试次数耗尽
+    """
+    delay = _BASE_BACKOFF_SECONDS
+    for attempt in range(_MAX_WRITE_ATTEMPTS):
+        try:
+            async with _write_sem:
+                return await operation()
+        except CosmosHttpResponseError as e:
+            if e.status_code != 429 or attempt == _MAX_WRITE_ATTEMPTS - 1:
+                raise
+            # 服务端明确给出的等待时间优先于本地估计
+            retry_after_ms = (e.headers or {}).get("x-ms-retry-after-ms")
+            if retry_after_ms:
+                await asyncio.sleep(float(retry_after_ms) / 1000.0)
+            else:
+                await asyncio.sleep(delay)
+                delay *= 2
+
+
+# ============================================================================
+# 容器索引策略
+# ============================================================================
+# 两个维度的调优：
+# 1. 复合索引——没有它时带 ORDER BY 的分区内查询每次都要在服务端排序，
+#    RU 随分区大小增长；复合索引让 ORDER BY 直接走索引顺序读取。
+# 2. 排除路径——Cosmos 默认索引文档的每个路径，每次写入都要更新
+#    所有这些索引；从不用于过滤/排序的大字段（消息正文、附件、
+#    系统提示词、密码哈希）排除后可明显降低写入 RU。
+
+# users：按 id 点读 + 按 email 回退查询；
+# passwordHash 和 settings 从不参与过滤，排除以降低写入成本。
+# (email, createdAt) 复合索引供将来需要按邮箱过滤并按注册时间
+# 排序的查询使用；_Q_USER_BY_EMAIL 刻意不依赖它（存量容器
+# 可能没有该索引，带多属性 ORDER BY 的查询会直接 400）。
+# 注意：索引策略只在建容器时生效，存量容器需在门户/CLI 上更新
+_USERS_INDEXING_POLICY: Dict[str, Any] = {
+    "includedPaths": [{"path": "/*"}],
+    "excludedPaths": [
+        {"path": "/passwordHash/?"},
+        {"path": "/settings/*"},
+    ],
+    "compositeIndexes": [
+        [
+            {"path": "/email", "order": "ascending"},
+            {"path": "/createdAt", "order": "descending"},
+        ],
+    ],
+}
+
+# conversations：列表查询是 WHERE userId = @u ORDER BY updatedAt DESC；
+# systemPrompt 可长达 4000 字符且从不过滤，排除
+_CONVERSATIONS_INDEXING_POLICY: Dict[str, Any] = {
+    "includedPaths": [{"path": "/*"}],
+    "excludedPaths": [
+        {"path": "/systemPrompt/?"},
+    ],
+    "compositeIndexes": [
+        [
+            {"path": "/userId", "order": "ascending"},
+            {"path": "/updatedAt", "order": "descending"},
+        ],
+    ],
+}
+
+# messages：写入最频繁的容器，采用白名单式索引——
+# 只索引查询用到的 conversationId/createdAt/role，
+# 正文、附件 JSON 和令牌统计全部排除
+_MESSAGES_INDEXING_POLICY: Dict[str, Any] = {
+    "includedPaths": [
+        {"path": "/conversationId/?"},
+        {"path": "/createdAt/?"},
+        {"path": "/role/?"},
+    ],
+    "excludedPaths": [{"path": "/*"}],
+    "compositeIndexes": [
+        [
+            {"path": "/conversationId", "order": "ascending"},
+            {"path": "/createdAt", "order": "ascending"},
+        ],
+        [
+            {"path": "/conversationId", "order": "ascending"},
+            {"path": "/createdAt", "order": "descending"},
+        ],
+    ],
+}
+
+
+# ============================================================================
+# 查询常量
+# ============================================================================
+# 查询文本在模块加载时构建一次，调用时只需绑定参数值，
+# 避免每个请求重新拼接字符串和创建参数列表的小对象。
+# 所有查询在调用处都显式传 partition_key=，把执行限定在单个逻辑分区：
+# SDK 可走乐观直连执行（ODE），跳过网关的查询计划往返。
+
+# 按邮箱查用户（仅存量用户的回退路径，见 get_user_by_email）
+# TOP 1：邮箱应当唯一，第一行即答案；不加上限时服务端会把
+# 整个 feed 扫到底并全部返回，RU 随分区大小增长。
+# 注意：不要加多属性 ORDER BY——它要求匹配的复合索引已存在，
+# 而 create_container_if_not_exists 不会给存量容器更新索引策略，
+# 存量部署上会 400 导致所有登录失败；等值过滤本身已能走
+# /email 的范围索引，复合索引只是锦上添花（见 _USERS_INDEXING_POLICY）
+_Q_USER_BY_EMAIL = "SELECT TOP 1 * FROM c WHERE c.email = @email"
+
+# 用户对话列表（OFFSET 分页，投影掉 systemPrompt）
+_Q_CONVERSATIONS_BY_USER = """
+    SELECT c.id, c.userId, c.title, c.model, c.messageCount,
+           c.createdAt, c.updatedAt
+    FROM c
+    WHERE c.userId = @userId
+    ORDER BY c.updatedAt DESC
+    OFFSET @offset LIMIT @limit
+"""
+
+# 用户对话列表（延续令牌分页，分页由 max_item_count 驱动）
+_Q_CONVERSATIONS_PAGE = """
+    SELECT c.id, c.userId, c.title, c.model, c.messageCount,
+           c.createdAt, c.updatedAt
+    FROM c
+    WHERE c.userId = @userId
+    ORDER BY c.updatedAt DESC
+"""
+
+# 对话消息：加载指定时间点之前的更早消息（"加载更多"）
+_Q_MESSAGES_BEFORE = """
+    SELECT * FROM c
+    WHERE c.conversationId = @conversationId
+    AND c.createdAt < @beforeCreatedAt
+    ORDER BY c.createdAt DESC
+    OFFSET 0 LIMIT @limit
+"""
+
+# 对话消息：最新消息按时间正序
+_Q_MESSAGES_LATEST = """
+    SELECT * FROM c
+    WHERE c.conversationId = @conversationId
+    ORDER BY c.createdAt ASC
+    OFFSET 0 LIMIT @limit
+"""
+
+# LLM 上下文历史（只投影 role/content）
+_Q_CHAT_HISTORY = """
+    SELECT c.role, c.content FROM c
+    WHERE c.conversationId = @conversationId
+    ORDER BY c.createdAt ASC
+    OFFSET 0 LIMIT @limit
+"""
+
+# 级联删除前收集消息 ID
+_Q_MESSAGE_IDS = "SELECT c.id FROM c WHERE c.conversationId = @conversationId"
+
+# 用户对话总数（存量用户的回退路径，见 count_conversations_by_user）
+_Q_CONVERSATION_COUNT = "SELECT VALUE COUNT(1) FROM c WHERE c.userId = @userId"
+
+
 class CosmosDBService:
     """
     Azure Cosmos DB 服务类。
@@ -111,8 +324,36 @@ class CosmosDBService:
         # 数据库实例
         self.database = None
         # 容器（集合）字典，键为容器名称
+        # 容器代理在此初始化后常驻，后续操作不再发控制面请求
         self.containers: Dict[str, Any] = {}
 
+        # ========== 幂等初始化控制 ==========
+        # ready 标志 + 协程锁：重复调用 initialize() 直接返回，
+        # 并发的首批调用也只会执行一次控制面往返
+        self._initialized = False
+        self._init_lock = asyncio.Lock()
+
+        # ========== 用户文档缓存 ==========
+        # 每个带认证的请求都要按 ID 读一次用户文档（JWT 校验后取用户）；
+        # 短 TTL 的内存缓存把这条热路径上的远程点读换成本地查表。
+        # update_user 会主动失效对应条目，60 秒的过期时间限制了
+        # 多进程部署下其他 worker 看到旧数据的窗口
+        self._user_cache: TTLCache = TTLCache(maxsize=10_000, ttl=60)
+
+        # ========== 对话文档缓存 ==========
+        # 聊天端点每轮都要点读对话做所有权校验并取 systemPrompt；
+        # 键为 (conversation_id, user_id)，更新/删除/计数递增时主动失效。
+        # 与用户缓存同样的 60 秒 TTL 限制多 worker 下的陈旧窗口
+        self._conv_cache: TTLCache = TTLCache(maxsize=2_048, ttl=60)
+
+        # ========== ETag 重验证缓存 ==========
+        # 存活比上面的短 TTL 缓存久得多：短缓存过期后不直接全量点读，
+        # 而是带 If-None-Match 做条件读——文档未变时服务端返回 304，
+        # 固定只收 1 RU 且不传输文档体，直接复用这里保留的旧副本。
+        # 文档确实变了时照常返回新文档并刷新两级缓存
+        self._user_etag_cache: TTLCache = TTLCache(maxsize=10_000, ttl=3600)
+        self._conv_etag_cache: TTLCache = TTLCache(maxsize=2_048, ttl=3600)
+
     async def initialize(self) -> None:
         """
         初始化 Cosmos DB 客户端和容器。
@@ -123,13 +364,28 @@ class CosmosDBService:
         3. 创建所有必需的容器（如果不存在）
         
         幂等性：
+        - ready 标志 + 协程锁：重复/并发调用只执行一次初始化，
+          每个冷调用省掉 4 次控制面往返
         - 使用 create_*_if_not_exists 方法确保可重复执行
         - 已存在的资源不会被重新创建或修改
-        
+
         Note:
             应该在应用启动时调用一次，通常在依赖注入中处理
         """
-        # 创建 Cosmos DB 客户端
+        # 快路径：已初始化则直接返回（无锁）
+        if self._initialized:
+            return
+
+        async with self._init_lock:
+            # 双重检查：等锁期间可能已被其他协程初始化
+            if self._initialized:
+                return
+            await self._do_initialize()
+            self._initialized = True
+
+    async def _do_initialize(self) -> None:
+        """执行实际的初始化（仅由 initialize() 在锁内调用一次）。"""
+        # 创建 Cosmos DB 客户端（异步）
         # 使用端点 URL 和主密钥进行认证
         self.client = CosmosClient(
             url=self.settings.cosmos_db_endpoint,
@@ -138,32 +394,56 @@ class CosmosDBService:
 
         # 创建数据库（如果不存在）
         # 默认吞吐量由 Azure 门户中的设置决定
-        self.database = self.client.create_database_if_not_exists(
+        self.database = await self.client.create_database_if_not_exists(
             id=self.settings.cosmos_db_database_name
         )
 
         # ========== 创建容器 ==========
-        
-        # 用户容器
-        # 分区键使用 /id，因为用户查询通常按 ID 进行
-        self.containers["users"] = self.database.create_container_if_not_exists(
-            id="users",
-            partition_key=PartitionKey(path="/id"),
+        # 三个 create_container_if_not_exists 相互独立，且每个都是
+        # 一次较慢的控制面往返（常见 200ms+）；并行执行后冷启动的
+        # 容器创建耗时从 3 次往返塌缩到 1 次
+        #
+        # 分区键选择：
+        # - users: /id——用户查询通常按 ID 进行
+        # - conversations: /userId——最常见的查询是获取某用户的所有对话
+        # - messages: /conversationId——最常见的查询是获取某对话的所有消息
+        #
+        # messages 的长期目标是分层分区键 PartitionKey(
+        # path=["/userId", "/conversationId"], kind="MultiHash")：
+        # 单对话读取仍落在一个子分区，同时支持按用户前缀做跨对话查询
+        # （如令牌消耗报表）而无需跨分区扇出。分区键无法原地变更，
+        # 切换需要建新容器迁移数据并把所有点操作改为传完整的
+        # [userId, conversationId] 键；消息文档已冗余 userId 字段
+        # （见 create_message），为迁移做好了数据准备
+        users, conversations, messages = await asyncio.gather(
+            self.database.create_container_if_not_exists(
+                id="users",
+                partition_key=PartitionKey(path="/id"),
+                indexing_policy=_USERS_INDEXING_POLICY,
+            ),
+            self.database.create_container_if_not_exists(
+                id="conversations",
+                partition_key=PartitionKey(path="/userId"),
+                indexing_policy=_CONVERSATIONS_INDEXING_POLICY,
+            ),
+            self.database.create_container_if_not_exists(
+                id="messages",
+                partition_key=PartitionKey(path="/conversationId"),
+                indexing_policy=_MESSAGES_INDEXING_POLICY,
+            ),
         )
+        self.containers["users"] = users
+        self.containers["conversations"] = conversations
+        self.containers["messages"] = messages
 
-        # 对话容器
-        # 分区键使用 /userId，因为最常见的查询是获取某用户的所有对话
-        self.containers["conversations"] = self.database.create_container_if_not_exists(
-            id="conversations",
-            partition_key=PartitionKey(path="/userId"),
-        )
-
-        # 消息容器
-        # 分区键使用 /conversationId，因为最常见的查询是获取某对话的所有消息
-        self.containers["messages"] = self.database.create_container_if_not_exists(
-            id="messages",
-            partition_key=PartitionKey(path="/conversationId"),
-        )
+    async def close(self) -> None:
+        """关闭异步客户端，应在应用关闭时调用（lifespan shutdown）。"""
+        if self.client is not None:
+            await self.client.close()
+            self.client = None
+            self.database = None
+            self.containers.clear()
+            self._initialized = False
 
     def _get_container(self, container_name: str) -> ContainerProxy:
         """
@@ -202,7 +482,10 @@ class CosmosDBService:
                 
         Returns:
             Dict: 创建的用户文档，包含生成的 ID 和时间戳
-            
+
+        Raises:
+            CosmosResourceExistsError: 邮箱已被注册（索引文档 id 冲突）
+
         Example:
             user = await db.create_user({
                 "email": "user@example.com",
@@ -213,9 +496,10 @@ class CosmosDBService:
         container = self._get_container("users")
         
         # 生成唯一的用户 ID
-        user_id = str(uuid.uuid4())
+        # hex 形式跳过 UUID.__str__ 的连字符格式化（ID 对外不透明）
+        user_id = uuid.uuid4().hex
         # 使用 UTC 时间戳，ISO 8601 格式
-        now = datetime.now(timezone.utc).isoformat()
+        now = _now_iso()
         
         # 构建完整的用户文档
         user = {
@@ -225,6 +509,8 @@ class CosmosDBService:
             "passwordHash": user_data["passwordHash"],
             "createdAt": now,
             "updatedAt": now,
+            # 对话总数的反规范化计数（见 count_conversations_by_user）
+            "conversationCount": 0,
             # 用户默认设置
             "settings": {
                 "defaultModel": "gpt-4o",  # 默认使用的 AI 模型
@@ -232,8 +518,32 @@ class CosmosDBService:
             },
         }
         
-        # 保存到 Cosmos DB
-        container.create_item(body=user)
+        # ========== 邮箱索引文档（先写，兼作唯一性约束） ==========
+        # 以小写邮箱为 id 的轻量索引项，与用户文档同容器（分区键 /id）。
+        # 登录时按邮箱查找用户即可点读该索引（1 RU），
+        # 不再对所有物理分区做跨分区扫描。
+        # 先写索引：Cosmos 拒绝重复 id，邮箱已注册时这里抛出
+        # CosmosResourceExistsError 且不会留下用户文档——
+        # 一次往返同时完成"查重 + 占位"，无需前置查询
+        email_key = user_data["email"].lower()
+        await container.create_item(body={
+            "id": email_key,
+            "type": "emailIndex",
+            "userId": user_id,
+        })
+
+        # 保存用户文档；失败时补偿删除索引文档——
+        # 否则孤儿索引会永久占住该邮箱（后续注册报"已存在"，
+        # 而按邮箱查找又解析到不存在的用户），且无人清理
+        try:
+            await container.create_item(body=user)
+        except Exception:
+            try:
+                await container.delete_item(item=email_key, partition_key=email_key)
+            except CosmosResourceNotFoundError:
+                pass
+            raise
+
         return user
 
     async def get_user_by_id(self, user_id: str) -> Optional[Dict[str, Any]]:
@@ -249,48 +559,83 @@ class CosmosDBService:
         Returns:
             Optional[Dict]: 用户文档，如果不存在则返回 None
         """
+        # 缓存命中时省掉远程点读（认证热路径，每个请求都会调用）
+        cached = self._user_cache.get(user_id)
+        if cached is not None:
+            return dict(cached)
+
         container = self._get_container("users")
-        
+
+        # 条件读：短缓存过期但仍持有旧副本时带 If-None-Match 重验证，
+        # 文档未变则 304 + 1 RU，不用按文档大小付全量读的 RU
+        stale = self._user_etag_cache.get(user_id)
+        headers: Optional[Dict[str, Any]] = None
+        if stale is not None and stale.get("_etag"):
+            headers = {"If-None-Match": stale["_etag"]}
+
         try:
             # 使用点读操作（最高效）
             # partition_key 必须与 item 匹配
-            return container.read_item(item=user_id, partition_key=user_id)
+            user = await container.read_item(
+                item=user_id, partition_key=user_id, initial_headers=headers
+            )
         except CosmosResourceNotFoundError:
             # 用户不存在
             return None
 
+        # 304 Not Modified：SDK 的传输层只对 >= 400 的状态码抛异常，
+        # 304 不抛，read_item 返回一个空文档——用空结果判定命中，
+        # 复用旧副本；空文档绝不能进缓存（会让调用方 KeyError）
+        if not user:
+            if stale is None:
+                return None
+            self._user_cache[user_id] = stale
+            return dict(stale)
+
+        self._user_cache[user_id] = user
+        self._user_etag_cache[user_id] = user
+        # 返回副本，调用方的就地修改不会污染缓存
+        return dict(user)
+
     async def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
         """
         根据邮箱地址获取用户信息。
-        
-        由于邮箱不是分区键，需要跨分区查询。
-        这比按 ID 查询效率低，但邮箱在用户表中应该是唯一的。
-        
+
+        优先点读邮箱索引文档（见 create_user）：两次点读共约 2 RU，
+        替代随物理分区数线性放大的跨分区扫描。
+        索引文档不存在时（早期注册的存量用户）回退到跨分区查询。
+
         Args:
             email: 用户邮箱地址
-            
+
         Returns:
             Optional[Dict]: 用户文档，如果不存在则返回 None
-            
-        Note:
-            enable_cross_partition_query=True 允许跨所有分区查询
-            生产环境中可以考虑为 email 字段建立索引
         """
         container = self._get_container("users")
-        
-        # 使用参数化查询防止 SQL 注入
-        query = "SELECT * FROM c WHERE c.email = @email"
+        email_key = email.lower()
+
+        # 快路径：点读邮箱索引，再点读用户文档
+        try:
+            index_item = await container.read_item(
+                item=email_key, partition_key=email_key
+            )
+            return await self.get_user_by_id(index_item["userId"])
+        except CosmosResourceNotFoundError:
+            pass
+
+        # 回退：跨分区查询（仅存量用户会走到这里）
+        # 使用参数化查询防止 SQL 注入；TOP 1 + max_item_count=1
+        # 把扫描和传输都钳制到单行，拿到首个匹配立即停止消费
         parameters: list[dict[str, object]] = [{"name": "@email", "value": email}]
-        
-        # 执行跨分区查询
-        items = list(container.query_items(
-            query=query,
+
+        async for item in container.query_items(
+            query=_Q_USER_BY_EMAIL,
             parameters=parameters,
-            enable_cross_partition_query=True,  # 必须启用跨分区查询
-        ))
-        
-        # 返回第一个匹配的用户（邮箱应该是唯一的）
-        return items[0] if items else None
+            max_item_count=1,
+        ):
+            return item
+
+        return None
 
     async def update_user(self, user_id: str, updates: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """
@@ -304,26 +649,38 @@ class CosmosDBService:
             
         Returns:
             Optional[Dict]: 更新后的用户文档，如果用户不存在则返回 None
-            
+
         Note:
-            Cosmos DB 不支持部分更新（Patch），需要替换整个文档
-            这在高并发场景下可能导致冲突，可以使用乐观锁处理
+            使用服务端部分更新（Patch）：只传输变更的字段路径，
+            写入 RU 不随整个文档大小增长，且单次往返内原子完成，
+            没有"读-改-写"模式的丢失更新竞态。
+            Patch 单次最多 10 个操作，当前字段数远低于该限制。
         """
         container = self._get_container("users")
-        
-        # 先获取现有用户
-        user = await self.get_user_by_id(user_id)
-        if not user:
+
+        # 构建 Patch 操作列表：每个字段一个 set 操作 + 修改时间
+        operations = [
+            {"op": "set", "path": f"/{key}", "value": value}
+            for key, value in updates.items()
+        ]
+        operations.append({
+            "op": "set",
+            "path": "/updatedAt",
+            "value": _now_iso(),
+        })
+
+        # 先失效缓存，避免并发读取看到更新前的旧文档
+        self._user_cache.pop(user_id, None)
+
+        try:
+            # patch_item 返回更新后的完整文档
+            return await container.patch_item(
+                item=user_id,
+                partition_key=user_id,
+                patch_operations=operations,
+            )
+        except CosmosResourceNotFoundError:
             return None
-        
-        # 更新字段
-        user.update(updates)
-        # 更新修改时间
-        user["updatedAt"] = datetime.now(timezone.utc).isoformat()
-        
-        # 替换整个文档
-        container.replace_item(item=user_id, body=user)
-        return user
 
     # ========================================================================
     # 对话操作 (Conversation Operations)
@@ -360,8 +717,8 @@ class CosmosDBService:
         container = self._get_container("conversations")
         
         # 生成唯一的对话 ID
-        conversation_id = str(uuid.uuid4())
-        now = datetime.now(timezone.utc).isoformat()
+        conversation_id = uuid.uuid4().hex
+        now = _now_iso()
         
         # 构建对话文档，使用默认值填充可选字段
         conversation = {
@@ -375,9 +732,42 @@ class CosmosDBService:
             "updatedAt": now,
         }
         
-        container.create_item(body=conversation)
+        # 经写入信号量 + 429 退避执行，限流时按服务端提示重试
+        await _with_backoff(lambda: container.create_item(body=conversation))
+
+        # 同步维护用户文档上的反规范化对话计数（incr 服务端原子自增）
+        await self._adjust_conversation_count(user_id, 1)
+
         return conversation
 
+    async def _adjust_conversation_count(self, user_id: str, by: int) -> None:
+        """
+        调整用户文档上的反规范化对话计数。
+
+        create_conversation/delete_conversation 各调一次；
+        计数维护失败（如存量用户文档缺少该字段之外的异常）
+        不应让主操作失败，count_conversations_by_user 有查询回退。
+
+        Args:
+            user_id: 用户 ID
+            by: 调整量（+1 或 -1）
+        """
+        users = self._get_container("users")
+        # 先失效缓存，避免读到旧计数
+        self._user_cache.pop(user_id, None)
+        try:
+            await users.patch_item(
+                item=user_id,
+                partition_key=user_id,
+                patch_operations=[
+                    {"op": "incr", "path": "/conversationCount", "value": by},
+                ],
+            )
+        except CosmosHttpResponseError:
+            # 用户文档不存在或字段类型异常时放弃计数维护，
+            # 统计路径会回退到 COUNT 查询
+            pass
+
     async def get_conversation(
         self, conversation_id: str, user_id: str
     ) -> Optional[Dict[str, Any]]:
@@ -396,17 +786,42 @@ class CosmosDBService:
         Returns:
             Optional[Dict]: 对话文档，如果不存在或不属于该用户则返回 None
         """
+        # 缓存命中时省掉远程点读（聊天热路径，每轮消息都会调用）
+        cache_key = (conversation_id, user_id)
+        cached = self._conv_cache.get(cache_key)
+        if cached is not None:
+            return dict(cached)
+
         container = self._get_container("conversations")
-        
+
+        # 条件读：与 get_user_by_id 相同的 If-None-Match 重验证策略
+        stale = self._conv_etag_cache.get(cache_key)
+        headers: Optional[Dict[str, Any]] = None
+        if stale is not None and stale.get("_etag"):
+            headers = {"If-None-Match": stale["_etag"]}
+
         try:
             # 使用点读操作，partition_key 确保安全性和效率
-            conversation = container.read_item(
-                item=conversation_id, partition_key=user_id
+            conversation = await container.read_item(
+                item=conversation_id, partition_key=user_id, initial_headers=headers
             )
-            return conversation
         except CosmosResourceNotFoundError:
             return None
 
+        # 304 Not Modified：SDK 不抛异常而是返回空文档
+        # （传输层只对 >= 400 raise），与 get_user_by_id 同样
+        # 用空结果判定命中并复用旧副本，空文档绝不进缓存
+        if not conversation:
+            if stale is None:
+                return None
+            self._conv_cache[cache_key] = stale
+            return dict(stale)
+
+        self._conv_cache[cache_key] = conversation
+        self._conv_etag_cache[cache_key] = conversation
+        # 返回副本，调用方的就地修改不会污染缓存
+        return dict(conversation)
+
     async def get_conversations_by_user(
         self,
         user_id: str,
@@ -425,53 +840,102 @@ class CosmosDBService:
             offset: 跳过的对话数（默认0，用于分页）
             
         Returns:
-            List[Dict]: 对话文档列表
-            
+            List[Dict]: 对话摘要文档列表（不含 systemPrompt）
+
         Note:
-            enable_cross_partition_query=False 因为我们按分区键查询
-            这确保查询只在用户的分区内执行，效率更高
+            只投影列表 UI 实际渲染的字段：systemPrompt 可长达 4000 字符，
+            RU 成本和传输量都随文档大小增长，侧边栏用不到它。
+            需要完整文档（含 systemPrompt）时用 get_conversation 点读
         """
         container = self._get_container("conversations")
-        
-        # 使用 SQL 查询获取对话列表
+
+        # 使用 SQL 查询获取对话列表（投影代替 SELECT *，见模块级常量）
         # ORDER BY updatedAt DESC 确保最近活跃的对话排在前面
-        query = """
-            SELECT * FROM c
-            WHERE c.userId = @userId
-            ORDER BY c.updatedAt DESC
-            OFFSET @offset LIMIT @limit
-        """
         parameters = [
             {"name": "@userId", "value": user_id},
             {"name": "@offset", "value": offset},
             {"name": "@limit", "value": limit},
         ]
-        
-        # 不需要跨分区查询，因为按分区键（userId）过滤
-        items = list(container.query_items(
-            query=query,
-            parameters=parameters,
-            enable_cross_partition_query=False,
-        ))
+
+        # 指定 partition_key，查询只在该用户的分区内执行
+        items = [
+            item
+            async for item in container.query_items(
+                query=_Q_CONVERSATIONS_BY_USER,
+                parameters=parameters,
+                partition_key=user_id,
+            )
+        ]
         
         return items
 
+    async def get_conversations_page(
+        self,
+        user_id: str,
+        limit: int = 20,
+        continuation_token: Optional[str] = None,
+    ) -> tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        用延续令牌分页获取用户的对话列表。
+
+        OFFSET/LIMIT 分页每翻一页都要重新扫过被跳过的行并照常计费；
+        延续令牌让服务端直接从上一页的索引位置继续，
+        翻到第 N 页的成本与 N 无关。
+
+        Args:
+            user_id: 用户 ID
+            limit: 每页的最大对话数（默认20）
+            continuation_token: 上一页返回的延续令牌（首页为 None）
+
+        Returns:
+            tuple: (对话摘要列表, 下一页的延续令牌)
+                   令牌为 None 表示没有更多数据
+        """
+        container = self._get_container("conversations")
+
+        # 与 offset 版本相同的投影，但不带 OFFSET/LIMIT——
+        # 分页由 max_item_count + 延续令牌驱动
+        parameters = [{"name": "@userId", "value": user_id}]
+
+        pager = container.query_items(
+            query=_Q_CONVERSATIONS_PAGE,
+            parameters=parameters,
+            partition_key=user_id,
+            max_item_count=limit,
+        ).by_page(continuation_token)
+
+        try:
+            page = await pager.__anext__()
+        except StopAsyncIteration:
+            return [], None
+
+        items = [item async for item in page]
+        return items, pager.continuation_token
+
     async def update_conversation(
-        self, conversation_id: str, user_id: str, updates: Dict[str, Any]
+        self,
+        conversation_id: str,
+        user_id: str,
+        updates: Dict[str, Any],
+        etag: Optional[str] = None,
     ) -> Optional[Dict[str, Any]]:
         """
         更新对话信息。
-        
+
         使用白名单机制只允许更新特定字段，防止恶意修改。
-        
+        不做前置读取：partition_key=user_id 已经把操作限定在
+        该用户的分区内，等价于所有权校验，省掉一次点读往返。
+
         Args:
             conversation_id: 对话 ID
             user_id: 用户 ID（用于验证所有权）
             updates: 要更新的字段字典
-            
+            etag: 可选的乐观并发控制。调用方已持有文档时传入其
+                  _etag，文档在读取后被他人修改则更新失败（412）
+
         Returns:
             Optional[Dict]: 更新后的对话文档，如果不存在则返回 None
-            
+
         允许更新的字段：
         - title: 对话标题
         - systemPrompt: 系统提示词
@@ -479,24 +943,83 @@ class CosmosDBService:
         - messageCount: 消息计数
         """
         container = self._get_container("conversations")
-        
-        # 先获取现有对话（同时验证所有权）
-        conversation = await self.get_conversation(conversation_id, user_id)
-        if not conversation:
-            return None
-        
+
         # 白名单机制：只允许更新指定字段
         allowed_updates = {"title", "systemPrompt", "model", "messageCount"}
-        for key, value in updates.items():
-            if key in allowed_updates:
-                conversation[key] = value
-        
-        # 更新修改时间
-        conversation["updatedAt"] = datetime.now(timezone.utc).isoformat()
-        
-        # 替换整个文档
-        container.replace_item(item=conversation_id, body=conversation)
-        return conversation
+
+        # 构建 Patch 操作：白名单字段 + 修改时间
+        # 服务端部分更新只传输变更路径，单次往返原子完成，
+        # 不再需要"读-改-写"整个文档
+        operations = [
+            {"op": "set", "path": f"/{key}", "value": value}
+            for key, value in updates.items()
+            if key in allowed_updates
+        ]
+        operations.append({
+            "op": "set",
+            "path": "/updatedAt",
+            "value": _now_iso(),
+        })
+
+        # 先失效缓存，避免并发读取看到更新前的旧文档
+        self._conv_cache.pop((conversation_id, user_id), None)
+
+        # 乐观并发控制：仅当文档未被修改时才应用更新
+        kwargs: Dict[str, Any] = {}
+        if etag:
+            kwargs["etag"] = etag
+            kwargs["match_condition"] = MatchConditions.IfNotModified
+
+        try:
+            # partition_key=user_id 同时完成所有权验证：
+            # 不属于该用户的对话在其分区内不存在，返回 404
+            return await container.patch_item(
+                item=conversation_id,
+                partition_key=user_id,
+                patch_operations=operations,
+                **kwargs,
+            )
+        except CosmosResourceNotFoundError:
+            return None
+
+    async def increment_message_count(
+        self, conversation_id: str, user_id: str, by: int = 1
+    ) -> Optional[Dict[str, Any]]:
+        """
+        原子递增对话的消息计数。
+
+        用 Patch 的 incr 操作在服务端完成自增：单次往返、
+        RU 只按补丁大小计费，且并发追加消息时不会出现
+        "读到相同计数后互相覆盖"的丢失更新。
+
+        Args:
+            conversation_id: 对话 ID
+            user_id: 用户 ID（分区键，同时验证所有权）
+            by: 递增量（默认 1；一问一答场景传 2）
+
+        Returns:
+            Optional[Dict]: 更新后的对话文档，如果不存在则返回 None
+        """
+        container = self._get_container("conversations")
+
+        # 计数与更新时间即将变化，先失效缓存
+        self._conv_cache.pop((conversation_id, user_id), None)
+
+        try:
+            return await container.patch_item(
+                item=conversation_id,
+                partition_key=user_id,
+                patch_operations=[
+                    {"op": "incr", "path": "/messageCount", "value": by},
+                    {
+                        "op": "set",
+                        "path": "/updatedAt",
+                        "value": _now_iso(),
+                    },
+                ],
+            )
+        except CosmosResourceNotFoundError:
+            return None
 
     async def delete_conversation(self, conversation_id: str, user_id: str) -> bool:
         """
@@ -519,14 +1042,20 @@ class CosmosDBService:
             生产环境可考虑使用事务或后台清理任务
         """
         container = self._get_container("conversations")
-        
+
+        # 失效缓存，已删除的对话不应再命中
+        self._conv_cache.pop((conversation_id, user_id), None)
+
         try:
             # 删除对话文档
-            container.delete_item(item=conversation_id, partition_key=user_id)
-            
+            await container.delete_item(item=conversation_id, partition_key=user_id)
+
             # 级联删除所有消息
             await self.delete_messages_by_conversation(conversation_id)
-            
+
+            # 维护用户文档上的反规范化对话计数
+            await self._adjust_conversation_count(user_id, -1)
+
             return True
         except CosmosResourceNotFoundError:
             return False
@@ -536,7 +1065,10 @@ class CosmosDBService:
     # ========================================================================
 
     async def create_message(
-        self, conversation_id: str, message_data: Dict[str, Any]
+        self,
+        conversation_id: str,
+        message_data: Dict[str, Any],
+        user_id: Optional[str] = None,
     ) -> Dict[str, Any]:
         """
         在对话中创建新消息。
@@ -552,7 +1084,9 @@ class CosmosDBService:
                 可选字段：
                 - attachments: 附件列表（图片等）
                 - tokens: 令牌使用统计
-                
+            user_id: 所属用户 ID（冗余存储在消息文档上，
+                为分层分区键迁移和按用户聚合查询做准备）
+
         Returns:
             Dict: 创建的消息文档
             
@@ -579,13 +1113,14 @@ class CosmosDBService:
         """
         container = self._get_container("messages")
         
-        message_id = str(uuid.uuid4())
-        now = datetime.now(timezone.utc).isoformat()
+        message_id = uuid.uuid4().hex
+        now = _now_iso()
         
         # 构建消息文档
         message = {
             "id": message_id,
             "conversationId": conversation_id,  # 分区键
+            "userId": user_id,                  # 冗余字段（见 user_id 参数说明）
             "role": message_data["role"],       # "user" 或 "assistant"
             "content": message_data["content"], # 消息文本内容
             "attachments": message_data.get("attachments", []),  # 附件列表
@@ -593,9 +1128,78 @@ class CosmosDBService:
             "createdAt": now,
         }
         
-        container.create_item(body=message)
+        # 经写入信号量 + 429 退避执行，限流时按服务端提示重试
+        await _with_backoff(lambda: container.create_item(body=message))
         return message
 
+    async def create_message_pair(
+        self,
+        conversation_id: str,
+        user_message_data: Dict[str, Any],
+        assistant_message_data: Dict[str, Any],
+        user_id: Optional[str] = None,
+    ) -> tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        在一次往返中创建一问一答两条消息。
+
+        每个聊天轮次都会写入一条用户消息和一条 AI 回复，
+        两者共享分区键 conversationId——正好满足事务批处理的
+        同分区约束：两次写入合并为一次原子往返，
+        要么都成功要么都不写入（不会留下没有回复的半个轮次）。
+
+        消息计数的 incr 补丁目标是 conversations 容器（不同分区键），
+        无法并入此批处理，调用方需另行调用 increment_message_count。
+
+        Args:
+            conversation_id: 对话 ID（分区键）
+            user_message_data: 用户消息数据（role/content/attachments）
+            assistant_message_data: AI 回复数据（role/content/tokens）
+            user_id: 所属用户 ID（冗余存储，见 create_message）
+
+        Returns:
+            tuple: (用户消息文档, AI 回复文档)
+        """
+        container = self._get_container("messages")
+
+        # 时间戳必须严格递增：所有消息查询都仅按 c.createdAt 排序，
+        # 两条消息共享同一时间戳会让轮次内顺序不确定（历史和回灌给
+        # 模型的上下文可能答在问前），before_id 分页的严格小于比较
+        # 还会把同时间戳的另一半悄悄丢掉。给 AI 回复加 1ms 作决定性
+        # 的排序键（写入本身仍是同一原子批次，观察不到中间状态）
+        base = datetime.fromtimestamp(time.time(), timezone.utc)
+        user_ts = base.isoformat()
+        assistant_ts = (base + timedelta(milliseconds=1)).isoformat()
+
+        def _build(message_data: Dict[str, Any], created_at: str) -> Dict[str, Any]:
+            return {
+                "id": uuid.uuid4().hex,
+                "conversationId": conversation_id,
+                "userId": user_id,
+                "role": message_data["role"],
+                "content": message_data["content"],
+                "attachments": message_data.get("attachments", []),
+                "tokens": message_data.get("tokens"),
+                "createdAt": created_at,
+            }
+
+        user_message = _build(user_message_data, user_ts)
+        assistant_message = _build(assistant_message_data, assistant_ts)
+
+        try:
+            await container.execute_item_batch(
+                batch_operations=[
+                    ("create", (user_message,)),
+                    ("create", (assistant_message,)),
+                ],
+                partition_key=conversation_id,
+            )
+        except (CosmosBatchOperationError, CosmosHttpResponseError):
+            # 批处理不可用时回退到两次顺序写入
+            await container.create_item(body=user_message)
+            await container.create_item(body=assistant_message)
+
+        return user_message, assistant_message
+
     async def get_messages_by_conversation(
         self,
         conversation_id: str,
@@ -625,41 +1229,78 @@ class CosmosDBService:
         
         if before_id:
             # 加载更多：获取指定消息之前的消息
-            # 使用子查询获取参考消息的时间戳
-            query = """
-                SELECT * FROM c
-                WHERE c.conversationId = @conversationId
-                AND c.createdAt < (SELECT c2.createdAt FROM c c2 WHERE c2.id = @beforeId)
-                ORDER BY c.createdAt DESC
-                OFFSET 0 LIMIT @limit
-            """
+            # 先用点读（~1 RU）取参考消息的时间戳，再做简单的范围查询；
+            # 相关子查询会强制服务端逐条扫描，且无法利用
+            # (conversationId, createdAt) 复合索引
+            try:
+                reference = await container.read_item(
+                    item=before_id, partition_key=conversation_id
+                )
+            except CosmosResourceNotFoundError:
+                # 参考消息不存在（可能已被删除），返回空结果
+                return []
+
+            query = _Q_MESSAGES_BEFORE
             parameters = [
                 {"name": "@conversationId", "value": conversation_id},
-                {"name": "@beforeId", "value": before_id},
+                {"name": "@beforeCreatedAt", "value": reference["createdAt"]},
                 {"name": "@limit", "value": limit},
             ]
         else:
             # 获取最新消息：按时间正序
-            query = """
-                SELECT * FROM c
-                WHERE c.conversationId = @conversationId
-                ORDER BY c.createdAt ASC
-                OFFSET 0 LIMIT @limit
-            """
+            query = _Q_MESSAGES_LATEST
             parameters = [
                 {"name": "@conversationId", "value": conversation_id},
                 {"name": "@limit", "value": limit},
             ]
         
-        # 不需要跨分区查询
-        items: list[dict[str, Any]] = list(container.query_items(
-            query=query,
-            parameters=parameters,
-            enable_cross_partition_query=False,
-        ))
+        # 指定 partition_key，查询只在该对话的分区内执行
+        items: list[dict[str, Any]] = [
+            item
+            async for item in container.query_items(
+                query=query,
+                parameters=parameters,
+                partition_key=conversation_id,
+            )
+        ]
         
         return items
 
+    async def get_chat_history(
+        self, conversation_id: str, limit: int = 20
+    ) -> List[Dict[str, Any]]:
+        """
+        获取用于构建 LLM 上下文的轻量消息历史。
+
+        聊天端点每轮都要取一遍历史，但只用到 role 和 content；
+        SELECT * 会把附件 JSON、令牌统计等一并传输并反序列化。
+        投影这两个字段后，每轮解析的 JSON 体积只剩实际进入
+        提示词的部分（SDK 不提供序列化器钩子，减少要解析的
+        字节数是降低编解码 CPU 的直接手段）。
+
+        Args:
+            conversation_id: 对话 ID
+            limit: 返回的最大消息数（默认20，与聊天上下文窗口一致）
+
+        Returns:
+            List[Dict]: 只含 role 和 content 的消息列表（按时间正序）
+        """
+        container = self._get_container("messages")
+
+        parameters = [
+            {"name": "@conversationId", "value": conversation_id},
+            {"name": "@limit", "value": limit},
+        ]
+
+        return [
+            item
+            async for item in container.query_items(
+                query=_Q_CHAT_HISTORY,
+                parameters=parameters,
+                partition_key=conversation_id,
+            )
+        ]
+
     async def delete_messages_by_conversation(self, conversation_id: str) -> int:
         """
         删除对话中的所有消息。
@@ -671,60 +1312,125 @@ class CosmosDBService:
             
         Returns:
             int: 删除的消息数量
-            
+
         实现说明：
-        1. 首先查询所有消息的 ID
-        2. 逐个删除消息
-        这种方式在消息量大时可能较慢，
-        生产环境可考虑批量删除或后台任务
+        流式消费 ID 查询的结果，攒满 100 条（单分区批量 API 的上限）
+        就提交一批事务删除，不把全部 ID 物化在内存里——
+        峰值内存与对话大小无关，始终是 O(批大小)。
+        消息容器的分区键就是 conversationId，整个级联删除天然
+        满足"同分区"约束：N 次删除只需 ⌈N/100⌉ 次往返。
+        某批失败时只对该批回退到并发单条删除，继续处理后续批次
         """
         container = self._get_container("messages")
-        
+
         # 只查询 ID，减少数据传输
-        query = "SELECT c.id FROM c WHERE c.conversationId = @conversationId"
         parameters: list[dict[str, object]] = [{"name": "@conversationId", "value": conversation_id}]
-        
-        items = list(container.query_items(
-            query=query,
-            parameters=parameters,
-            enable_cross_partition_query=False,
-        ))
-        
-        # 逐个删除消息
+
         count = 0
-        for item in items:
-            container.delete_item(item=item["id"], partition_key=conversation_id)
-            count += 1
-        
+        chunk: List[str] = []
+
+        # 流式攒批：边消费查询结果边提交删除批次。
+        # max_item_count=1000 放大服务端页大小，ID 投影本身很小，
+        # 大页减少取页往返，同时删除批次与下一页的抓取相互重叠
+        async for item in container.query_items(
+            query=_Q_MESSAGE_IDS,
+            parameters=parameters,
+            partition_key=conversation_id,
+            max_item_count=1000,
+        ):
+            chunk.append(item["id"])
+            if len(chunk) == 100:
+                count += await self._delete_message_chunk(container, conversation_id, chunk)
+                chunk = []
+
+        if chunk:
+            count += await self._delete_message_chunk(container, conversation_id, chunk)
+
         return count
 
+    async def _delete_message_chunk(
+        self,
+        container: ContainerProxy,
+        conversation_id: str,
+        ids: List[str],
+    ) -> int:
+        """
+        删除一批（≤100 条）消息，返回成功删除的数量。
+
+        快路径是单次往返的事务批处理；整批失败时（如某条消息
+        已被删除导致整批回滚）只对这一批回退到并发单条删除。
+        """
+        # ========== 快路径：事务批处理 ==========
+        try:
+            # 级联删除可能一次提交数十批，经写入信号量 + 429 退避执行
+            await _with_backoff(lambda: container.execute_item_batch(
+                batch_operations=[
+                    ("delete", (message_id,)) for message_id in ids
+                ],
+                partition_key=conversation_id,
+            ))
+            return len(ids)
+        except (CosmosBatchOperationError, CosmosHttpResponseError):
+            pass
+
+        # ========== 回退：并发单条删除 ==========
+        # 32 的并发度之后收益递减，同时避免触发限流
+        sem = asyncio.Semaphore(32)
+
+        async def _delete(message_id: str) -> None:
+            async with sem:
+                await container.delete_item(
+                    item=message_id, partition_key=conversation_id
+                )
+
+        # return_exceptions=True：单条失败不中断整批，只统计成功数
+        results = await asyncio.gather(
+            *(_delete(message_id) for message_id in ids),
+            return_exceptions=True,
+        )
+        return sum(1 for r in results if not isinstance(r, Exception))
+
     async def count_conversations_by_user(self, user_id: str) -> int:
         """
         统计用户的对话总数。
         
         用于分页显示时提供总数信息。
-        使用 COUNT 聚合函数，效率高于获取所有文档后计数。
-        
+
+        快路径读取用户文档上的反规范化计数 conversationCount
+        （创建/删除对话时用 incr 补丁维护，用户文档本身带缓存，
+        每个列表请求省掉一次 COUNT 查询的 RU）。
+        存量用户文档没有该字段时回退到 COUNT 聚合查询。
+
         Args:
             user_id: 用户 ID
-            
+
         Returns:
             int: 对话总数
-            
+
         Note:
-            使用 SELECT VALUE COUNT(1) 直接返回数值，而非文档
+            回退路径使用 SELECT VALUE COUNT(1) 直接返回数值，而非文档
         """
+        # 快路径：用户文档上的反规范化计数（通常命中内存缓存）
+        user = await self.get_user_by_id(user_id)
+        if user is not None:
+            count = user.get("conversationCount")
+            if isinstance(count, int):
+                # incr 补丁失败的极端情况下计数可能为负，钳制到 0
+                return max(count, 0)
+
         container = self._get_container("conversations")
         
         # 使用 COUNT 聚合函数
-        query = "SELECT VALUE COUNT(1) FROM c WHERE c.userId = @userId"
         parameters: list[dict[str, object]] = [{"name": "@userId", "value": user_id}]
-        
-        items = list(container.query_items(
-            query=query,
-            parameters=parameters,
-            enable_cross_partition_query=False,
-        ))
-        
+
+        items = [
+            item
+            async for item in container.query_items(
+                query=_Q_CONVERSATION_COUNT,
+                parameters=parameters,
+                partition_key=user_id,
+            )
+        ]
+
         # COUNT 返回单个数值，使用 cast 告知类型检查器 SELECT VALUE 返回的是整数
         return cast(int, items[0]) if items else 0
\ No newline at end of file
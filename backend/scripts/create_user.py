@@ -38,19 +38,13 @@
 │           │                                                               │
 │           ▼                                                               │
 │  ┌────────────────────────────────────────────────────────┐             │
-│  │  1. 检查邮箱是否已存在                                    │             │
-│  │     └─> CosmosDBService.get_user_by_email()             │             │
-│  └────────────────────────────────────────────────────────┘             │
-│           │                                                               │
-│           ▼                                                               │
-│  ┌────────────────────────────────────────────────────────┐             │
-│  │  2. 对密码进行 bcrypt 哈希                               │             │
+│  │  1. 对密码进行 bcrypt 哈希                               │             │
 │  │     └─> security.get_password_hash()                    │             │
 │  └────────────────────────────────────────────────────────┘             │
 │           │                                                               │
 │           ▼                                                               │
 │  ┌────────────────────────────────────────────────────────┐             │
-│  │  3. 创建用户记录                                         │             │
+│  │  2. 创建用户记录（邮箱唯一性由索引文档 id 冲突保证）       │             │
 │  │     └─> CosmosDBService.create_user()                   │             │
 │  │         - id: UUID                                       │             │
 │  │         - email: 邮箱                                    │             │
@@ -63,40 +57,14 @@
 """
 
 import asyncio
-import sys
-import os
-
-# ============================================================================
-# 路径设置
-# ============================================================================
-
-# 获取 backend 目录路径（脚本所在目录的父目录）
-# __file__ 是当前脚本路径：backend/scripts/create_user.py
-# 第一个 dirname 得到：backend/scripts
-# 第二个 dirname 得到：backend
-BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-
-# 将 backend 目录添加到 Python 路径
-# 这样就能正确导入 app.services.cosmos_db 等模块
-sys.path.insert(0, BACKEND_DIR)
-
-# 切换工作目录到 backend，确保能找到 .env 文件
-os.chdir(BACKEND_DIR)
-
-# 加载 .env 文件中的环境变量
-try:
-    from dotenv import load_dotenv
-    load_dotenv(os.path.join(BACKEND_DIR, ".env"))
-    load_dotenv(os.path.join(BACKEND_DIR, ".env.local"), override=True)
-except ImportError:
-    # 如果没有安装 python-dotenv，依赖 pydantic-settings 自动加载
-    pass
 
 from typing import Optional
 
-# 导入数据库服务和密码哈希函数
-from app.services.cosmos_db import CosmosDBService
-from app.core.security import get_password_hash
+# 资源已存在异常：邮箱索引文档 id 冲突即邮箱已注册
+from azure.cosmos.exceptions import CosmosResourceExistsError
+
+# 共享的环境引导与预热好的 Cosmos 单例（见 scripts/_db.py）
+from _db import bootstrap, get_db
 
 
 # ============================================================================
@@ -137,6 +105,10 @@ async def create_user(email: str, password: str, username: Optional[str] = None)
           Username: admin
           Created: 2024-01-01T00:00:00.000Z
     """
+    # 延迟导入 app 模块：依赖 bootstrap() 设置的 sys.path 与环境，
+    # 且避免导入本文件时就加载整个应用配置
+    from app.core.security import get_password_hash
+
     # 如果没有提供用户名，从邮箱地址提取
     # 例如："john@example.com" -> "john"
     if username is None:
@@ -145,32 +117,31 @@ async def create_user(email: str, password: str, username: Optional[str] = None)
     print(f"Creating user: {email}")
     print(f"Username: {username}")
     
-    # 初始化 Cosmos DB 连接
+    # 获取共享的 Cosmos DB 连接（幂等初始化 + 连接预热）
     # 需要环境变量：
     # - AZURE_COSMOSDB_ENDPOINT
     # - AZURE_COSMOSDB_KEY
     # - AZURE_COSMOSDB_DATABASE
-    db = CosmosDBService()
-    await db.initialize()
-    
-    # 检查邮箱是否已被注册
-    # 返回 None 表示未注册
-    existing_user = await db.get_user_by_email(email)
-    if existing_user:
-        print(f"Error: User with email {email} already exists!")
-        return None
-    
+    db = await get_db()
+
     # 使用 bcrypt 算法对密码进行哈希
     # bcrypt 自动处理盐值生成和哈希
     password_hash = get_password_hash(password)
-    
+
     # 创建用户记录
-    # create_user 方法会自动添加 id 和 createdAt 字段
-    user = await db.create_user({
-        "email": email,
-        "username": username,
-        "passwordHash": password_hash,
-    })
+    # create_user 方法会自动添加 id 和 createdAt 字段。
+    # 无需前置查重：邮箱唯一性由邮箱索引文档的 id 冲突保证，
+    # 重复邮箱在写入时原子失败（省掉一次查询往返）
+    try:
+        user = await db.create_user({
+            "email": email,
+            "username": username,
+            "passwordHash": password_hash,
+        })
+    except CosmosResourceExistsError:
+        print(f"Error: User with email {email} already exists!")
+        await db.close()
+        return None
     
     # 打印创建成功信息
     print(f"User created successfully!")
@@ -178,7 +149,10 @@ async def create_user(email: str, password: str, username: Optional[str] = None)
     print(f"  Email: {user['email']}")
     print(f"  Username: {user['username']}")
     print(f"  Created: {user['createdAt']}")
-    
+
+    # 关闭异步客户端，释放连接池
+    await db.close()
+
     return user
 
 
@@ -189,7 +163,10 @@ async def create_user(email: str, password: str, username: Optional[str] = None)
 if __name__ == "__main__":
     # 脚本直接运行时执行
     # 可以修改这里的参数来创建不同的用户
-    
+
+    # 准备运行环境（路径 / .env）
+    bootstrap()
+
     # 示例：创建一个测试用户
     # 建议通过环境变量传递密码，不要硬编码
     # password = os.getenv("USER_PASSWORD", "default_secure_password")
@@ -72,73 +72,71 @@
 """
 
 import asyncio
-import sys
-import os
 import argparse
 
-# ============================================================================
-# 路径设置
-# ============================================================================
-
-# 获取 backend 目录路径（脚本所在目录的父目录）
-BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-
-# 将 backend 目录添加到 Python 路径
-sys.path.insert(0, BACKEND_DIR)
-
-# 切换工作目录到 backend，确保能找到 .env 文件
-os.chdir(BACKEND_DIR)
-
-# 加载 .env 文件中的环境变量
-try:
-    from dotenv import load_dotenv
-    load_dotenv(os.path.join(BACKEND_DIR, ".env"))
-    load_dotenv(os.path.join(BACKEND_DIR, ".env.local"), override=True)
-except ImportError:
-    # 如果没有安装 python-dotenv，依赖 pydantic-settings 自动加载
-    pass
-
 from typing import Optional, Dict, Any
 
-# 导入数据库服务
-from app.services.cosmos_db import CosmosDBService
+# CosmosBatchOperationError: 事务批处理失败异常（整批回滚）
+# CosmosHttpResponseError: Cosmos DB HTTP 错误基类
+# CosmosResourceNotFoundError: 资源未找到（存量用户可能没有邮箱索引文档）
+from azure.cosmos.exceptions import (
+    CosmosBatchOperationError,
+    CosmosHttpResponseError,
+    CosmosResourceNotFoundError,
+)
+
+# 共享的环境引导与预热好的 Cosmos 单例（见 scripts/_db.py）：
+# delete_user_by_email → delete_user_by_id 的调用链只建一个客户端，
+# 与其他脚本在同一进程内链式调用时也复用同一条连接
+from _db import bootstrap, get_db
 
 
 # ============================================================================
 # 用户删除函数
 # ============================================================================
 
-async def delete_user_by_id(user_id: str, confirm: bool = False) -> bool:
+async def delete_user_by_id(
+    user_id: str,
+    confirm: bool = False,
+    max_concurrency: int = 8,
+) -> bool:
     """
     根据用户 ID 删除用户及其所有数据。
-    
+
     执行级联删除：
     1. 删除用户的所有消息
     2. 删除用户的所有对话
     3. 删除用户记录
-    
+
+    并发说明：
+    各对话的消息删除相互独立，用有界并发同时处理多个对话
+    （每个对话内部走服务层的事务批处理）；对话文档的删除同理。
+    活跃用户的级联耗时从 O(N·RTT) 降到 O(N/并发度·RTT)。
+
     Args:
         user_id: 用户 ID (UUID)
         confirm: 是否跳过确认提示（脚本模式使用）
-        
+        max_concurrency: 同时处理的对话数上限
+            （调大加速删除但消耗更多 RU，遇到限流可调小）
+
     Returns:
         bool: 删除成功返回 True，失败返回 False
-        
+
     Example:
         >>> success = asyncio.run(delete_user_by_id("user-uuid", confirm=True))
         >>> print("Deleted" if success else "Failed")
     """
     print(f"Preparing to delete user with ID: {user_id}")
     print()
-    
-    # 初始化 Cosmos DB 连接
-    db = CosmosDBService()
-    await db.initialize()
+
+    # 获取共享的 Cosmos DB 连接（幂等初始化）
+    db = await get_db()
     
     # 1. 验证用户存在
     user = await db.get_user_by_id(user_id)
     if not user:
         print(f"Error: User not found with ID: {user_id}")
+        await db.close()
         return False
     
     # 显示用户信息
@@ -154,61 +152,97 @@ async def delete_user_by_id(user_id: str, confirm: bool = False) -> bool:
         response = input("⚠️  Are you sure you want to delete this user and ALL their data? (yes/no): ")
         if response.lower() != 'yes':
             print("Deletion cancelled.")
+            await db.close()
             return False
     
     print()
     print("Starting cascade deletion...")
     
     # 2. 获取用户的所有对话
+    # 对话按 /userId 分区，传 partition_key 把查询限定在单分区
     conversations_container = db.containers["conversations"]
-    conversations = list(conversations_container.query_items(
-        query="SELECT * FROM c WHERE c.userId = @userId",
-        parameters=[{"name": "@userId", "value": user_id}],
-        enable_cross_partition_query=True,
-    ))
-    
+    conversations = [
+        conv
+        async for conv in conversations_container.query_items(
+            query="SELECT * FROM c WHERE c.userId = @userId",
+            parameters=[{"name": "@userId", "value": user_id}],
+            partition_key=user_id,
+        )
+    ]
+
     print(f"Found {len(conversations)} conversations to delete")
-    
+
     # 3. 删除每个对话下的所有消息
-    messages_container = db.containers["messages"]
-    total_messages_deleted = 0
-    
-    for conv in conversations:
-        conv_id = conv["id"]
-        # 获取该对话的所有消息
-        messages = list(messages_container.query_items(
-            query="SELECT * FROM c WHERE c.conversationId = @convId",
-            parameters=[{"name": "@convId", "value": conv_id}],
-            enable_cross_partition_query=True,
-        ))
-        
-        # 删除消息
-        for msg in messages:
-            messages_container.delete_item(
-                item=msg["id"],
-                partition_key=conv_id  # 消息的分区键是 conversationId
-            )
-            total_messages_deleted += 1
-        
-        print(f"  Deleted {len(messages)} messages from conversation: {conv.get('title', conv_id)}")
-    
+    # 有界并发：同时处理 max_concurrency 个对话，每个对话内部
+    # 由服务层按 100 条一批的事务批处理删除（流式攒批，内存 O(批)）
+    sem = asyncio.Semaphore(max_concurrency)
+
+    async def _delete_conv_messages(conv: Dict[str, Any]) -> int:
+        async with sem:
+            deleted = await db.delete_messages_by_conversation(conv["id"])
+        print(f"  Deleted {deleted} messages from conversation: {conv.get('title', conv['id'])}")
+        return deleted
+
+    # return_exceptions=True：单个对话失败不中断整体级联
+    message_results = await asyncio.gather(
+        *(_delete_conv_messages(conv) for conv in conversations),
+        return_exceptions=True,
+    )
+    total_messages_deleted = sum(
+        r for r in message_results if isinstance(r, int)
+    )
+
     print(f"Total messages deleted: {total_messages_deleted}")
-    
+
     # 4. 删除所有对话
-    for conv in conversations:
-        conversations_container.delete_item(
-            item=conv["id"],
-            partition_key=user_id  # 对话的分区键是 userId
+    # 所有对话共享分区键 userId，正好满足事务批处理的同分区约束：
+    # 按 100 条一批（批量 API 上限）单次往返原子删除，
+    # N 个对话只需 ⌈N/100⌉ 次往返。整批失败时回退到有界并发单条删除
+    conv_ids = [conv["id"] for conv in conversations]
+    try:
+        for start in range(0, len(conv_ids), 100):
+            chunk = conv_ids[start:start + 100]
+            await conversations_container.execute_item_batch(
+                batch_operations=[("delete", (cid,)) for cid in chunk],
+                partition_key=user_id,
+            )
+    except (CosmosBatchOperationError, CosmosHttpResponseError):
+        # 回退：有界并发单条删除，尽量清掉能删的部分
+        async def _delete_conv(conv_id: str) -> None:
+            async with sem:
+                await conversations_container.delete_item(
+                    item=conv_id,
+                    partition_key=user_id,  # 对话的分区键是 userId
+                )
+
+        await asyncio.gather(
+            *(_delete_conv(cid) for cid in conv_ids),
+            return_exceptions=True,
         )
-    
+
     print(f"Deleted {len(conversations)} conversations")
-    
+
     # 5. 删除用户记录
     users_container = db.containers["users"]
-    users_container.delete_item(
+    await users_container.delete_item(
         item=user_id,
         partition_key=user_id  # 用户的分区键是 id
     )
+
+    # 6. 删除邮箱索引文档（登录点读用的反向索引，见 create_user）
+    # 早期注册的存量用户没有索引文档，404 直接忽略
+    email_key = str(user.get("email", "")).lower()
+    if email_key:
+        try:
+            await users_container.delete_item(
+                item=email_key,
+                partition_key=email_key,
+            )
+        except CosmosResourceNotFoundError:
+            pass
+
+    # 关闭异步客户端，释放连接池
+    await db.close()
     
     print()
     print("=" * 60)
@@ -235,15 +269,15 @@ async def delete_user_by_email(email: str, confirm: bool = False) -> bool:
     """
     print(f"Searching for user with email: {email}")
     print()
-    
-    # 初始化 Cosmos DB 连接
-    db = CosmosDBService()
-    await db.initialize()
-    
+
+    # 获取共享的 Cosmos DB 连接（幂等初始化）
+    db = await get_db()
+
     # 查找用户
     user = await db.get_user_by_email(email)
     if not user:
         print(f"Error: User not found with email: {email}")
+        await db.close()
         return False
     
     # 使用用户 ID 执行删除
@@ -298,8 +332,11 @@ def parse_args():
 # ============================================================================
 
 if __name__ == "__main__":
+    # 准备运行环境（路径 / .env）
+    bootstrap()
+
     args = parse_args()
-    
+
     if args.email:
         # 按邮箱删除
         asyncio.run(delete_user_by_email(args.email, confirm=args.yes))
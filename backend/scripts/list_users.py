@@ -51,36 +51,105 @@
 
 import asyncio
 import sys
-import os
+
+from typing import Optional, List, Dict, Any
+
+# 共享的环境引导与预热好的 Cosmos 单例（见 scripts/_db.py）
+# 注意：app 与 azure 的导入都在函数内部（延迟导入）。
+# azure-cosmos 的导入耗时数百毫秒，app 包还会触发配置加载；
+# 只想复用 _format_user 等纯函数的导入方不应付这笔成本。
+from _db import bootstrap, get_db
+
 
 # ============================================================================
-# 路径设置
+# 展示与查询辅助函数
 # ============================================================================
 
-# 获取 backend 目录路径（脚本所在目录的父目录）
-BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 展示字段的缺省值：一次字典合并补齐所有缺失键，
+# 替代循环体内逐字段的 .get(key, 'N/A') 默认值处理
+_USER_DEFAULTS: Dict[str, Any] = {
+    "id": "N/A",
+    "username": "N/A",
+    "email": "N/A",
+    "createdAt": "N/A",
+    "updatedAt": "N/A",
+}
 
-# 将 backend 目录添加到 Python 路径
-# 这样才能导入 app 包中的模块
-sys.path.insert(0, BACKEND_DIR)
+_SETTINGS_DEFAULTS: Dict[str, Any] = {
+    "defaultModel": "N/A",
+    "theme": "N/A",
+}
 
-# 切换工作目录到 backend，确保能找到 .env 文件
-os.chdir(BACKEND_DIR)
+# 预编译的输出模板：format_map 对合并后的字典一次性填充全部字段，
+# 无设置的用户（多数情况）完全跳过设置分支的字典查找
+_USER_TMPL = (
+    "[{i}] User: {username}\n"
+    "    ID: {id}\n"
+    "    Email: {email}\n"
+    "    Created: {createdAt}\n"
+    "    Updated: {updatedAt}"
+)
+_SETTINGS_TMPL = "\n    Settings: Model={defaultModel}, Theme={theme}"
+_USER_SEP = "-" * 60
 
-# 加载 .env 文件中的环境变量
-# 使用 python-dotenv 库（如果 pydantic-settings 无法自动加载）
-try:
-    from dotenv import load_dotenv
-    load_dotenv(os.path.join(BACKEND_DIR, ".env"))
-    load_dotenv(os.path.join(BACKEND_DIR, ".env.local"), override=True)
-except ImportError:
-    # 如果没有安装 python-dotenv，依赖 pydantic-settings 自动加载
-    pass
 
-from typing import Optional, List, Dict, Any
+def _format_user(idx: int, user: Dict[str, Any]) -> str:
+    """格式化单个用户的展示块（多行文本，末尾带分隔线）。"""
+    block = _USER_TMPL.format_map({**_USER_DEFAULTS, **user, "i": idx})
+    # 显示用户设置（如果有）
+    settings = user.get("settings")
+    if settings:
+        block += _SETTINGS_TMPL.format_map({**_SETTINGS_DEFAULTS, **settings})
+    return block + "\n" + _USER_SEP
+
+
+async def _query_users_parallel(container, query: str) -> Optional[List[Dict[str, Any]]]:
+    """
+    按物理分区的 feed range 并行执行跨分区查询。
+
+    默认的跨分区迭代器逐分区串行取页，总耗时是所有分区之和；
+    按 feed range 拆分后用 asyncio.gather 并行抓取，
+    总耗时约等于最慢的单个分区。SELECT 无 ORDER BY 时
+    跨分区顺序本就不保证，乱序合并没有语义变化。
+
+    Args:
+        container: users 容器代理
+        query: 要执行的查询
+
+    Returns:
+        Optional[List[Dict]]: 合并后的结果；只有一个分区或
+            当前 SDK 不支持 feed range 查询时返回 None，
+            调用方应回退到串行流式路径
+    """
+    # 延迟导入：仅此函数需要，避免模块导入即加载 azure SDK
+    from azure.cosmos.exceptions import CosmosHttpResponseError
 
-# 导入数据库服务
-from app.services.cosmos_db import CosmosDBService
+    try:
+        feed_ranges = [fr async for fr in container.read_feed_ranges()]
+    except AttributeError:
+        # 旧版 SDK 没有 read_feed_ranges
+        return None
+
+    if len(feed_ranges) <= 1:
+        return None
+
+    async def _drain(feed_range) -> List[Dict[str, Any]]:
+        return [
+            user
+            async for user in container.query_items(
+                query=query,
+                feed_range=feed_range,
+                max_item_count=100,
+            )
+        ]
+
+    try:
+        results = await asyncio.gather(*(_drain(fr) for fr in feed_ranges))
+    except (TypeError, CosmosHttpResponseError):
+        # feed_range 查询参数不被支持时回退
+        return None
+
+    return [user for chunk in results for user in chunk]
 
 
 # ============================================================================
@@ -103,44 +172,87 @@ async def list_all_users() -> List[Dict[str, Any]]:
     """
     print("Listing all users...")
     print()
-    
-    # 初始化 Cosmos DB 连接
-    db = CosmosDBService()
-    await db.initialize()
-    
+
+    # 获取共享的 Cosmos DB 连接（幂等初始化）
+    db = await get_db()
+
     # 获取 users 容器
     container = db.containers["users"]
-    
-    # 查询所有用户
-    # 使用跨分区查询
-    query = "SELECT * FROM c"
-    items = list(container.query_items(
-        query=query,
-        enable_cross_partition_query=True,
-    ))
-    
-    # 输出用户列表
+
+    # 查询所有用户（跨分区查询）
+    # 只投影实际打印的字段：SELECT * 会连 passwordHash 和完整
+    # settings 子文档一起传输/反序列化，RU 和带宽都随文档大小计费；
+    # 投影后每行只剩展示用的浅字段。
+    # 同时过滤掉邮箱索引文档（与用户文档同容器，见 create_user）
+    query = """
+        SELECT c.id, c.username, c.email, c.createdAt, c.updatedAt, c.settings
+        FROM c
+        WHERE NOT IS_DEFINED(c.type)
+    """
+
+    items: List[Dict[str, Any]] = []
+    idx = 0
+
+    # ========== 快路径：按 feed range 并行扫描 ==========
+    # 多个物理分区时并行抓取，总耗时约等于最慢的单个分区
+    parallel_items = await _query_users_parallel(container, query)
+
+    if parallel_items is not None:
+        items = parallel_items
+        lines: List[str] = []
+        for idx, user in enumerate(items, 1):
+            if idx == 1:
+                lines.append("=" * 60)
+            lines.append(_format_user(idx, user))
+        if lines:
+            sys.stdout.write("\n".join(lines) + "\n")
+    else:
+        # ========== 回退：串行流式逐页消费（取页与打印解耦）==========
+        # 不等整个结果集取完就开始输出——
+        # 首页到达即打印（首字节延迟从全量查询时间降到一次 RTT）。
+        # 生产者/消费者各占一个任务：stdout 慢（tty、管道进 less）时
+        # 取页任务仍按网络线速预取后续页，有界队列（8 页）防止
+        # 内存无限增长；总耗时 ≈ max(网络, 打印) 而非两者之和。
+        # 整页攒成一段文本后一次 write，减少 write 系统调用
+        queue: "asyncio.Queue[Optional[List[Dict[str, Any]]]]" = asyncio.Queue(maxsize=8)
+
+        async def _produce() -> None:
+            """按线速取页并入队，结束时放入 None 哨兵。"""
+            async for page in container.query_items(
+                query=query,
+                max_item_count=100,
+            ).by_page():
+                await queue.put([user async for user in page])
+            await queue.put(None)
+
+        async def _consume() -> None:
+            """逐页格式化输出，收到哨兵后返回。"""
+            nonlocal idx
+            while True:
+                batch = await queue.get()
+                if batch is None:
+                    return
+                lines = []
+                for user in batch:
+                    idx += 1
+                    if idx == 1:
+                        lines.append("=" * 60)
+                    lines.append(_format_user(idx, user))
+                    items.append(user)
+                if lines:
+                    sys.stdout.write("\n".join(lines) + "\n")
+
+        await asyncio.gather(_produce(), _consume())
+
+    sys.stdout.flush()
+
     if not items:
         print("No users found in the database.")
         return []
-    
-    print(f"Found {len(items)} users:")
-    print("=" * 60)
-    
-    for idx, user in enumerate(items, 1):
-        print(f"[{idx}] User: {user.get('username', 'N/A')}")
-        print(f"    ID: {user.get('id', 'N/A')}")
-        print(f"    Email: {user.get('email', 'N/A')}")
-        print(f"    Created: {user.get('createdAt', 'N/A')}")
-        print(f"    Updated: {user.get('updatedAt', 'N/A')}")
-        # 显示用户设置（如果有）
-        settings = user.get('settings', {})
-        if settings:
-            print(f"    Settings: Model={settings.get('defaultModel', 'N/A')}, Theme={settings.get('theme', 'N/A')}")
-        print("-" * 60)
-    
+
     print("=" * 60)
-    
+    print(f"Found {len(items)} users.")
+
     return items
 
 
@@ -156,10 +268,9 @@ async def get_user_by_email(email: str) -> Optional[Dict[str, Any]]:
     """
     print(f"Searching for user with email: {email}")
     print()
-    
-    # 初始化 Cosmos DB 连接
-    db = CosmosDBService()
-    await db.initialize()
+
+    # 获取共享的 Cosmos DB 连接（幂等初始化）
+    db = await get_db()
     
     # 使用已有的方法查询
     user = await db.get_user_by_email(email)
@@ -198,10 +309,9 @@ async def get_user_by_id(user_id: str) -> Optional[Dict[str, Any]]:
     """
     print(f"Searching for user with ID: {user_id}")
     print()
-    
-    # 初始化 Cosmos DB 连接
-    db = CosmosDBService()
-    await db.initialize()
+
+    # 获取共享的 Cosmos DB 连接（幂等初始化）
+    db = await get_db()
     
     # 使用已有的方法查询
     user = await db.get_user_by_id(user_id)
@@ -234,7 +344,10 @@ if __name__ == "__main__":
     # 脚本直接运行时执行
     # 默认列出所有用户
     # 可以取消注释下面的代码来按邮箱或 ID 查询
-    
+
+    # 准备运行环境（路径 / .env）
+    bootstrap()
+
     # 列出所有用户
     asyncio.run(list_all_users())
     
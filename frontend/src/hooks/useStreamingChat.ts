@@ -169,6 +169,28 @@ export function useStreamingChat({
         let messageId = ''
         let tokens: TokenUsage | undefined
         let currentEventType = ''
+        let finalized = false
+
+        // Finalize as soon as message_end arrives: the server may keep the
+        // stream open for background work (e.g. conversation title
+        // generation), and the input should unlock without waiting for it
+        const finalizeAssistantMessage = () => {
+          if (finalized) return
+          finalized = true
+
+          const assistantMessage: Message = {
+            id: messageId || `msg-${Date.now()}`,
+            conversationId,
+            role: 'assistant',
+            content: fullContent,
+            tokens,
+            createdAt: new Date().toISOString(),
+          }
+
+          dispatch(endStreaming(assistantMessage))
+
+          onMessageComplete?.(assistantMessage)
+        }
 
         while (true) {
           const { done, value } = await reader.read()
@@ -217,7 +239,12 @@ export function useStreamingChat({
                   case 'message_end':
                     messageId = eventData.messageId || messageId
                     tokens = eventData.tokens
-                    // Handle conversation title update if present
+                    finalizeAssistantMessage()
+                    break
+
+                  case 'conversation_title':
+                    // Background title generation finished — update the
+                    // sidebar without holding up message finalization
                     if (eventData.conversationTitle) {
                       dispatch(
                         updateConversationTitle({
@@ -243,19 +270,8 @@ export function useStreamingChat({
           }
         }
 
-        // Finalize message
-        const assistantMessage: Message = {
-          id: messageId || `msg-${Date.now()}`,
-          conversationId,
-          role: 'assistant',
-          content: fullContent,
-          tokens,
-          createdAt: new Date().toISOString(),
-        }
-
-        dispatch(endStreaming(assistantMessage))
-
-        onMessageComplete?.(assistantMessage)
+        // Finalize on stream close (no-op if message_end already did)
+        finalizeAssistantMessage()
       } catch (error) {
         if (error instanceof Error && error.name === 'AbortError') {
           // Request was aborted, ignore
@@ -151,6 +151,10 @@ export interface StreamMessageEnd {
   tokens: TokenUsage
 }
 
+export interface StreamConversationTitle {
+  conversationTitle: string
+}
+
 export interface StreamError {
   error: string
 }
@@ -159,4 +163,5 @@ export type StreamEvent =
   | { type: 'message_start'; data: StreamMessageStart }
   | { type: 'content_delta'; data: StreamContentDelta }
   | { type: 'message_end'; data: StreamMessageEnd }
+  | { type: 'conversation_title'; data: StreamConversationTitle }
   | { type: 'error'; data: StreamError }
\ No newline at end of file